@@ -0,0 +1,218 @@
+#! /usr/bin/env python3
+
+# --------------------------------------------------------------------
+# Generator of synthetic BX programs of controllable shape
+
+# --------------------------------------------------------------------
+import argparse
+import os
+import random
+import sys
+
+# ====================================================================
+# The programs are well-typed, and are meant to be compiled rather than
+# run. Each shape stresses one dimension of the input:
+#
+#  - procs   : many small procedures, calling the previous ones
+#  - nested  : procedures made of deeply nested while/if statements
+#  - body    : a single procedure whose body grows with the size
+#  - exprs   : long arithmetic expressions
+#  - globals : many global variables, read and written by procedures
+
+SHAPES = ('procs', 'nested', 'body', 'exprs', 'globals')
+
+OPS = ('+', '-', '*', '&', '|', '^')
+CMP = ('<', '<=', '>', '>=', '==', '!=')
+
+class Generator:
+    def __init__(self, shape: str, seed: int = 0, depth: int = 8, length: int = 64):
+        assert(shape in SHAPES)
+
+        self.shape   = shape
+        self.rng     = random.Random(seed)
+        self.depth   = depth        # Nesting depth of the `nested` shape
+        self.length  = length       # Number of operators of the `exprs` shape
+        self.chunks  = []
+        self.size    = 0
+        self.procs   = 0
+        self.globals = 0
+
+    # ----------------------------------------------------------------
+    def emit(self, text: str):
+        self.chunks.append(text)
+        self.size += len(text)
+
+    # ----------------------------------------------------------------
+    def atom(self, vars: list[str]) -> str:
+        if vars and self.rng.random() < 0.7:
+            return self.rng.choice(vars)
+        return str(self.rng.randrange(0, 100))
+
+    def expr(self, vars: list[str], length: int) -> str:
+        aout = self.atom(vars)
+        for _ in range(length):
+            op = self.rng.choice(OPS)
+            if self.rng.random() < 0.2:
+                aout = f'({aout})'
+            aout = f'{aout} {op} {self.atom(vars)}'
+        return aout
+
+    def cond(self, vars: list[str]) -> str:
+        c1 = f'{self.atom(vars)} {self.rng.choice(CMP)} {self.atom(vars)}'
+        if self.rng.random() < 0.3:
+            c2 = f'{self.atom(vars)} {self.rng.choice(CMP)} {self.atom(vars)}'
+            c1 = f'{c1} {self.rng.choice(("&&", "||"))} !({c2})'
+        return c1
+
+    def call(self, vars: list[str]) -> str:
+        if self.procs == 0:
+            return self.expr(vars, 2)
+        callee = self.rng.randrange(max(0, self.procs - 8), self.procs)
+        return f'p{callee}({self.atom(vars)}, {self.atom(vars)})'
+
+    # ----------------------------------------------------------------
+    def stmts(self, vars: list[str], nlocals: list[int], count: int, depth: int, indent: str) -> list[str]:
+        aout = []
+
+        for _ in range(count):
+            choice = self.rng.random()
+
+            if depth > 0 and choice < 0.25:
+                aout.append(f'{indent}if ({self.cond(vars)}) {{')
+                aout.extend(self.stmts(vars, nlocals, 2, depth - 1, indent + '  '))
+                aout.append(f'{indent}}} else {{')
+                aout.extend(self.stmts(vars, nlocals, 1, depth - 1, indent + '  '))
+                aout.append(f'{indent}}}')
+
+            elif depth > 0 and choice < 0.4:
+                # A loop that runs at most 3 times
+                i = f'v{nlocals[0]}'; nlocals[0] += 1
+                aout.append(f'{indent}var {i} = 0 : int;')
+                aout.append(f'{indent}while ({i} < 3) {{')
+                aout.append(f'{indent}  {i} = {i} + 1;')
+                aout.extend(self.stmts(vars + [i], nlocals, 2, depth - 1, indent + '  '))
+                aout.append(f'{indent}  if ({self.cond(vars)}) {{ break; }}')
+                aout.append(f'{indent}}}')
+
+            elif choice < 0.6:
+                v = f'v{nlocals[0]}'; nlocals[0] += 1
+                aout.append(f'{indent}var {v} = {self.expr(vars, 3)} : int;')
+                vars = vars + [v]
+
+            elif choice < 0.8 and vars:
+                aout.append(f'{indent}{self.rng.choice(vars)} = {self.expr(vars, 3)};')
+
+            else:
+                aout.append(f'{indent}{self.rng.choice(vars or ["a"])} = {self.call(vars)};')
+
+        return aout
+
+    # ----------------------------------------------------------------
+    def proc(self, count: int, depth: int, gvars: list[str] = []):
+        lines = [f'def p{self.procs}(a : int, b : int) : int {{']
+        lines.extend(self.stmts(['a', 'b'] + gvars, [0], count, depth, '  '))
+        lines.append(f'  return {self.expr(["a", "b"], 2)};')
+        lines.append('}')
+        self.emit('\n'.join(lines) + '\n\n')
+        self.procs += 1
+
+    # ----------------------------------------------------------------
+    def chunk(self):
+        match self.shape:
+            case 'procs':
+                self.proc(4, 1)
+
+            case 'nested':
+                self.proc(2, self.depth)
+
+            case 'exprs':
+                lines = [f'def p{self.procs}(a : int, b : int) : int {{']
+                for k in range(4):
+                    lines.append(f'  var v{k} = {self.expr(["a", "b"] + [f"v{j}" for j in range(k)], self.length)} : int;')
+                lines.append(f'  return v3;')
+                lines.append('}')
+                self.emit('\n'.join(lines) + '\n\n')
+                self.procs += 1
+
+            case 'globals':
+                gvars = [f'g{self.globals + k}' for k in range(8)]
+                for g in gvars:
+                    self.emit(f'var {g} = {self.rng.randrange(100)} : int;\n')
+                self.globals += len(gvars)
+                self.emit('\n')
+                self.proc(4, 1, [f'g{self.rng.randrange(self.globals)}' for _ in range(8)])
+
+    # ----------------------------------------------------------------
+    def generate(self, size: int) -> str:
+        if self.shape == 'body':
+            # A single procedure, grown statement by statement
+            lines, nlocals = [], [0]
+            length = 0
+            while length < size:
+                stmts   = self.stmts(['a', 'b'], nlocals, 1, 2, '  ')
+                length += sum(len(x) + 1 for x in stmts)
+                lines.extend(stmts)
+            self.emit('def p0(a : int, b : int) : int {\n' + '\n'.join(lines) + '\n  return a;\n}\n\n')
+            self.procs = 1
+
+        while self.size < size:
+            self.chunk()
+
+        self.emit('def main() {\n')
+        for i in range(max(0, self.procs - 4), self.procs):
+            self.emit(f'  print(p{i}({i}, {i + 1}));\n')
+        self.emit('}\n')
+
+        return ''.join(self.chunks)
+
+# --------------------------------------------------------------------
+def generate(shape: str, size: int, seed: int = 0, **kw) -> str:
+    return Generator(shape, seed, **kw).generate(size)
+
+# --------------------------------------------------------------------
+def parse_size(size: str) -> int:
+    units = { 'k': 1 << 10, 'm': 1 << 20, 'g': 1 << 30 }
+    if size and size[-1].lower() in units:
+        return int(float(size[:-1]) * units[size[-1].lower()])
+    return int(size)
+
+# --------------------------------------------------------------------
+def _main():
+    parser = argparse.ArgumentParser(prog = os.path.basename(sys.argv[0]))
+    parser.add_argument(
+        'size', type = parse_size,
+        help = 'approximate size of the program, in bytes (K/M/G suffixes accepted)',
+    )
+    parser.add_argument(
+        '--shape', default = 'procs', choices = SHAPES,
+        help = 'shape of the program (default: procs)',
+    )
+    parser.add_argument(
+        '--seed', type = int, default = 0,
+        help = 'random seed (default: 0)',
+    )
+    parser.add_argument(
+        '--depth', type = int, default = 8,
+        help = 'nesting depth of the nested shape (default: 8)',
+    )
+    parser.add_argument(
+        '--length', type = int, default = 64,
+        help = 'number of operators per expression of the exprs shape (default: 64)',
+    )
+    parser.add_argument(
+        '-o', '--output', default = None,
+        help = 'output file (default: standard output)',
+    )
+    args = parser.parse_args()
+
+    prgm = generate(args.shape, args.size, args.seed, depth = args.depth, length = args.length)
+
+    if args.output is None:
+        sys.stdout.write(prgm)
+    else:
+        with open(args.output, 'w') as stream:
+            stream.write(prgm)
+
+# --------------------------------------------------------------------
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,145 @@
+#! /usr/bin/env python3
+
+# --------------------------------------------------------------------
+# Time and convergence of the dataflow analyses (bxdataflow) on large CFGs
+
+# --------------------------------------------------------------------
+import argparse
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bxlib import bxdriver
+from bxlib import bxdataflow
+from bxlib.bxast       import ProcDecl
+from bxlib.bxcfg       import CFG, tac2cfg
+from bxlib.bxerrors    import DefaultReporter
+from bxlib.bxmm        import MM
+from bxlib.bxtychecker import check as tycheck
+
+from bxgen import SHAPES, generate, parse_size
+
+# ====================================================================
+# The CFGs are the ones of the procedures of synthetic programs, straight
+# out of the maximal munch: they are not simplified by jthreading/uce,
+# that do not cope with the deepest ones. For each analysis, the time is
+# the one of all the procedures, and `visits` the number of transfers per
+# block (1 meaning that no block had to be visited twice).
+
+SIZES = ['64K', '256K', '1M']
+
+ANALYSES = {
+    'liveness' : lambda cfg, args: bxdataflow.Liveness(cfg),
+    'reaching' : lambda cfg, args: bxdataflow.ReachingDefinitions(cfg),
+    'available': lambda cfg, args: bxdataflow.AvailableExpressions(cfg),
+    'constants': lambda cfg, args: bxdataflow.Constants(cfg, args),
+}
+
+# --------------------------------------------------------------------
+def cfgs(prgm: str, parser: str, lexer: str) -> list[tuple[CFG, list[str]]] | None:
+    reporter = DefaultReporter(source = prgm)
+    bparser  = bxdriver.get_parser(parser, lexer)
+    bparser.reset(reporter)
+
+    prgm = bparser.parse(prgm)
+    if prgm is None or not tycheck(prgm, reporter = reporter):
+        return None
+
+    aout = []
+    for decl in prgm:
+        if isinstance(decl, ProcDecl):
+            tac = MM.mm_proc(decl)
+            aout.append((tac2cfg(tac.tac), tac.arguments))
+    return aout
+
+# --------------------------------------------------------------------
+def measure(procs: list[tuple[CFG, list[str]]], analysis: str) -> tuple[float, int]:
+    elapsed = 0.
+    visits  = 0
+
+    gc.collect()
+
+    for cfg, args in procs:
+        start    = time.perf_counter()
+        result   = ANALYSES[analysis](cfg, args)
+        elapsed += time.perf_counter() - start
+        visits  += result.visits
+
+    return elapsed, visits
+
+# --------------------------------------------------------------------
+def report(shape: str, rows: list[tuple[int, int, int, dict]]):
+    analyses = [x for x in ANALYSES if any(x in r for *_, r in rows)]
+
+    print(f'== shape: {shape}')
+    print(
+        f'{"size":>10} {"blocks":>8} {"largest":>8} ' +
+        ' '.join(f'{x + " (s)":>15} {"visits":>6}' for x in analyses)
+    )
+
+    for size, blocks, largest, results in rows:
+        line = f'{size >> 10:>8}Ki {blocks:>8} {largest:>8} '
+
+        for analysis in analyses:
+            elapsed, visits = results[analysis]
+            line += f'{elapsed:>15.3f} {visits / blocks:>6.2f} '
+
+        print(line.rstrip())
+
+    print()
+
+# --------------------------------------------------------------------
+def _main():
+    parser = argparse.ArgumentParser(prog = os.path.basename(sys.argv[0]))
+    parser.add_argument(
+        'sizes', nargs = '*', type = parse_size, default = [parse_size(x) for x in SIZES],
+        help = f'program sizes, in bytes, K/M suffixes accepted (default: {" ".join(SIZES)})',
+    )
+    parser.add_argument(
+        '--shape', action = 'append', choices = SHAPES, default = None,
+        help = 'shapes of programs to benchmark (repeatable, default: body and nested)',
+    )
+    parser.add_argument(
+        '--analysis', action = 'append', choices = list(ANALYSES), default = None,
+        help = 'analyses to run (repeatable, default: all)',
+    )
+    parser.add_argument(
+        '--depth', type = int, default = 8,
+        help = 'nesting depth of the nested shape (default: 8)',
+    )
+    parser.add_argument(
+        '--parser', default = 'pratt', choices = ('lalr', 'pratt'),
+        help = 'parser backend (default: pratt)',
+    )
+    parser.add_argument(
+        '--lexer', default = 'scan', choices = ('ply', 'scan'),
+        help = 'lexer backend (default: scan)',
+    )
+    args = parser.parse_args()
+
+    analyses = args.analysis or list(ANALYSES)
+
+    for shape in args.shape or ('body', 'nested'):
+        rows = []
+        for size in sorted(args.sizes):
+            procs = cfgs(generate(shape, size, depth = args.depth), args.parser, args.lexer)
+
+            if not procs:
+                print(f'== shape: {shape}, {size >> 10}Ki: rejected\n')
+                continue
+
+            rows.append((
+                size,
+                sum(len(cfg.cfg) for cfg, _ in procs),
+                max(len(cfg.cfg) for cfg, _ in procs),
+                { x: measure(procs, x) for x in analyses },
+            ))
+
+        report(shape, rows)
+
+# --------------------------------------------------------------------
+if __name__ == '__main__':
+    _main()
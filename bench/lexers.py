@@ -0,0 +1,91 @@
+#! /usr/bin/env python3
+
+# --------------------------------------------------------------------
+# Throughput of the PLY lexer vs. the single-pass scanner
+
+# --------------------------------------------------------------------
+import argparse
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bxlib.bxerrors import DefaultReporter
+from bxlib.bxlexer  import Lexer
+
+# ====================================================================
+CHUNK = """\
+var g{i} = {i} : int;
+
+def fact{i}(n : int) : int {{
+  // accumulator-passing factorial
+  var acc = 1 : int;
+  while (n > 0) {{
+    acc = acc * n;
+    n = n - 1;
+  }}
+  return acc;
+}}
+
+def diag{i}() {{
+  var x = 0 : int;
+  var sum = 0 : int;
+  while (true) {{
+    if (x >= 20 || !(sum != -1)) {{ break; }}
+    sum = sum + (x << 2) % 7 ^ ~x & 3;
+    x = x + 1;
+  }}
+  print(fact{i}(sum));
+}}
+"""
+
+def source(size: int) -> str:
+    chunks, length, i = [], 0, 0
+    while length < size:
+        chunks.append(CHUNK.format(i = i))
+        length += len(chunks[-1]); i += 1
+    return ''.join(chunks)
+
+# --------------------------------------------------------------------
+def run(backend: str, prgm: str):
+    lexer = Lexer.get_backend(backend)(reporter = DefaultReporter(prgm))
+    lexer.lexer.input(prgm)
+
+    gc.disable()
+    try:
+        start   = time.perf_counter()
+        tokens  = list(iter(lexer.lexer.token, None))
+        elapsed = time.perf_counter() - start
+    finally:
+        gc.enable()
+
+    tokens = [(t.type, t.value, t.lineno, t.lexpos) for t in tokens]
+    return elapsed, tokens, lexer.bol
+
+# --------------------------------------------------------------------
+def _main():
+    parser = argparse.ArgumentParser(prog = os.path.basename(sys.argv[0]))
+    parser.add_argument(
+        'sizes', nargs = '*', type = int, default = [1 << 20, 8 << 20],
+        help = 'input sizes, in bytes',
+    )
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        prgm    = source(size)
+        results = { x: run(x, prgm) for x in ('ply', 'scan') }
+
+        assert(results['ply'][1:] == results['scan'][1:])
+
+        for backend, (elapsed, tokens, _) in results.items():
+            print(
+                f'{backend:>4}: {len(prgm) >> 10:>8} KiB, {len(tokens):>9} tokens, '
+                f'{elapsed:7.3f}s, {len(prgm) / elapsed / (1 << 20):6.2f} MiB/s'
+            )
+        print(f'speedup: {results["ply"][0] / results["scan"][0]:.2f}x')
+
+# --------------------------------------------------------------------
+if __name__ == '__main__':
+    _main()
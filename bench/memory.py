@@ -0,0 +1,101 @@
+#! /usr/bin/env python3
+
+# --------------------------------------------------------------------
+# Peak RSS of the front-end on a large synthetic program
+
+# --------------------------------------------------------------------
+import argparse
+import gc
+import os
+import resource
+import subprocess as sp
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from lexers import source
+
+# ====================================================================
+def maxrss() -> int:
+    # ru_maxrss is in KiB on Linux, in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform != 'darwin' else rss >> 10
+
+# --------------------------------------------------------------------
+def child(backend: str, lexer: str, lazy: bool, size: int):
+    from bxlib.bxerrors import DefaultReporter
+    from bxlib.bxparser import Parser
+    from bxlib.bxpratt  import PrattParser
+
+    prgm   = source(size)
+    parser = Parser.get_backend(backend)(
+        reporter       = DefaultReporter(prgm),
+        lexer          = lexer,
+        lazy_positions = lazy,
+    )
+
+    gc.collect()
+    base  = maxrss()
+    start = time.perf_counter()
+    ast   = parser.parse(prgm)
+    elapsed = time.perf_counter() - start
+
+    assert(ast is not None)
+    print(base, maxrss(), elapsed)
+
+# --------------------------------------------------------------------
+def measure(backend: str, lexer: str, lazy: bool, size: int):
+    output = sp.run(
+        [sys.executable, __file__, '--child',
+         '--parser', backend, '--lexer', lexer, str(size)]
+        + (['--lazy-positions'] if lazy else []),
+        check = True, stdout = sp.PIPE, text = True,
+    ).stdout.split()
+
+    return int(output[0]), int(output[1]), float(output[2])
+
+# --------------------------------------------------------------------
+def _main():
+    parser = argparse.ArgumentParser(prog = os.path.basename(sys.argv[0]))
+    parser.add_argument(
+        'sizes', nargs = '*', type = int, default = [4 << 20],
+        help = 'input sizes, in bytes',
+    )
+    parser.add_argument(
+        '--parser', default = None, choices = ('lalr', 'pratt'),
+        help = 'parser backend (default: all)',
+    )
+    parser.add_argument(
+        '--lexer', default = 'scan', choices = ('ply', 'scan'),
+        help = 'lexer backend (default: scan)',
+    )
+    parser.add_argument(
+        '--lazy-positions', action = 'store_true',
+        help = 'store compact offsets instead of ranges in the AST',
+    )
+    parser.add_argument('--child', action = 'store_true', help = argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.parser, args.lexer, args.lazy_positions, args.sizes[0])
+        return
+
+    backends = ('lalr', 'pratt') if args.parser is None else (args.parser,)
+    configs  = [(x, lazy) for x in backends for lazy in (False, True)]
+
+    if args.lazy_positions:
+        configs = [(x, True) for x in backends]
+
+    for size in args.sizes:
+        for backend, lazy in configs:
+            base, peak, elapsed = measure(backend, args.lexer, lazy, size)
+            print(
+                f'{backend:>5} {"lazy " if lazy else "eager"}: {size >> 10:>8} KiB, '
+                f'peak RSS {peak >> 10:>6} MiB (+{(peak - base) >> 10:>6} MiB for the AST), '
+                f'{elapsed:7.3f}s'
+            )
+
+# --------------------------------------------------------------------
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,92 @@
+#! /usr/bin/env python3
+
+# --------------------------------------------------------------------
+# Throughput of the PLY LALR parser vs. the hand-written Pratt parser
+
+# --------------------------------------------------------------------
+import argparse
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bxlib.bxerrors import DefaultReporter
+from bxlib.bxlexer  import Lexer
+from bxlib.bxparser import Parser
+from bxlib.bxpratt  import PrattParser
+
+from lexers import source
+
+# --------------------------------------------------------------------
+def lex(lexer: str, prgm: str):
+    lexer = Lexer.get_backend(lexer)(reporter = DefaultReporter(prgm))
+    lexer.lexer.input(prgm)
+
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in iter(lexer.lexer.token, None):
+            pass
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+# --------------------------------------------------------------------
+def run(backend: str, lexer: str, lazy: bool, prgm: str):
+    parser = Parser.get_backend(backend)(
+        reporter       = DefaultReporter(prgm),
+        lexer          = lexer,
+        lazy_positions = lazy,
+    )
+
+    gc.disable()
+    try:
+        start   = time.perf_counter()
+        ast     = parser.parse(prgm)
+        elapsed = time.perf_counter() - start
+    finally:
+        gc.enable()
+
+    assert(ast is not None)
+    return elapsed, ast
+
+# --------------------------------------------------------------------
+def _main():
+    parser = argparse.ArgumentParser(prog = os.path.basename(sys.argv[0]))
+    parser.add_argument(
+        'sizes', nargs = '*', type = int, default = [1 << 20, 4 << 20],
+        help = 'input sizes, in bytes',
+    )
+    parser.add_argument(
+        '--lexer', default = 'scan', choices = ('ply', 'scan'),
+        help = 'lexer backend (default: scan)',
+    )
+    parser.add_argument(
+        '--lazy-positions', action = 'store_true',
+        help = 'store compact offsets instead of ranges in the AST',
+    )
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        prgm    = source(size)
+        lexing  = lex(args.lexer, prgm)
+        results = { x: run(x, args.lexer, args.lazy_positions, prgm) for x in ('lalr', 'pratt') }
+
+        assert(results['lalr'][1] == results['pratt'][1])
+
+        for backend, (elapsed, _) in results.items():
+            print(
+                f'{backend:>5}: {len(prgm) >> 10:>8} KiB, '
+                f'{elapsed:7.3f}s, {len(prgm) / elapsed / (1 << 20):6.2f} MiB/s'
+            )
+        print(f'lexing: {lexing:7.3f}s')
+        print(
+            f'speedup: {results["lalr"][0] / results["pratt"][0]:.2f}x, '
+            f'{(results["lalr"][0] - lexing) / (results["pratt"][0] - lexing):.2f}x without lexing'
+        )
+
+# --------------------------------------------------------------------
+if __name__ == '__main__':
+    _main()
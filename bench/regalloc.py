@@ -0,0 +1,166 @@
+#! /usr/bin/env python3
+
+# --------------------------------------------------------------------
+# Spills and remaining copies of the register allocators (bxregalloc)
+
+# --------------------------------------------------------------------
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bxlib import bxdriver
+from bxlib import bxregalloc
+from bxlib.bxast       import ProcDecl
+from bxlib.bxasmgen    import AsmGen
+from bxlib.bxerrors    import DefaultReporter
+from bxlib.bxtac       import TAC, TACProc
+from bxlib.bxtychecker import check as tycheck
+
+from bxgen import SHAPES, generate, parse_size
+
+# ====================================================================
+# Each allocator is run on the optimised TAC of all the procedures of
+# a synthetic program. For each one, are reported:
+#
+#  - spilled: the temporaries spilled under register pressure
+#  - stack  : the temporaries that live on the stack (the spilled ones,
+#             and the ones that must stay in memory)
+#  - slots  : the stack slots of these temporaries, that share slots when
+#             their live ranges are disjoint
+#  - cost   : the spill cost of the temporaries on the stack, i.e. their
+#             reads and writes weighted by 10^(loop depth)
+#  - copies : the copies between temporaries that are left, i.e. whose
+#             source and destination are not in the same register
+#
+# The `none` allocator is the one of -O0: everything on the stack.
+
+SIZES = ['4K', '16K', '64K']
+
+# --------------------------------------------------------------------
+def procedures(prgm: str, parser: str, lexer: str) -> list[TACProc] | None:
+    reporter = DefaultReporter(source = prgm)
+    bparser  = bxdriver.get_parser(parser, lexer)
+    bparser.reset(reporter)
+
+    prgm = bparser.parse(prgm)
+    if prgm is None or not tycheck(prgm, reporter = reporter):
+        return None
+
+    return [
+        bxdriver.lower_proc(decl, optlevel = 0)[0]
+        for decl in prgm if isinstance(decl, ProcDecl)
+    ]
+
+# --------------------------------------------------------------------
+def measure(procs: list[TACProc], allocator: str | None) -> dict:
+    abk  = AsmGen.get_backend('x64-linux')
+    aout = dict(temps = 0, spilled = 0, stack = 0, slots = 0, cost = 0, copies = 0, time = 0.)
+
+    for proc in procs:
+        live  = bxregalloc.LiveSets(proc.tac)
+        costs = bxregalloc.spill_costs(live)
+        temps = set(costs) | set(filter(bxregalloc.is_temp, proc.arguments))
+
+        if allocator is None:
+            alloc = bxregalloc.Allocation({}, set(), { x: i for i, x in enumerate(sorted(temps)) })
+        else:
+            start = time.perf_counter()
+            alloc = abk.allocate(proc, allocator)
+            aout['time'] += time.perf_counter() - start
+
+        where = lambda x: alloc.registers.get(x, x)
+
+        aout['temps'  ] += len(temps)
+        aout['spilled'] += len(alloc.spilled)
+        aout['stack'  ] += len(temps - set(alloc.registers))
+        aout['slots'  ] += len(set(alloc.slots.values()))
+        aout['cost'   ] += sum(costs.get(x, 0) for x in temps if x not in alloc.registers)
+        aout['copies' ] += sum(
+            1 for x in proc.tac
+              if isinstance(x, TAC) and x.opcode == 'copy'
+              and bxregalloc.is_temp(x.arguments[0])
+              and where(x.arguments[0]) != where(x.result)
+        )
+
+    return aout
+
+# --------------------------------------------------------------------
+def report(shape: str, size: int, procs: list[TACProc], rows: dict[str, dict]):
+    temps = rows['none']['temps']
+
+    print(f'== shape: {shape}, {size >> 10}Ki, {len(procs)} procedure(s), {temps} temporaries')
+    print(f'{"allocator":<10} {"spilled":>8} {"stack":>8} {"slots":>8} {"cost":>12} {"copies":>8} {"time (s)":>9}')
+
+    for name, row in rows.items():
+        print(
+            f'{name:<10} {row["spilled"]:>8} {row["stack"]:>8} {row["slots"]:>8} {row["cost"]:>12} '
+            f'{row["copies"]:>8} {row["time"]:>9.4f}'
+        )
+
+    print()
+
+# --------------------------------------------------------------------
+def _main():
+    parser = argparse.ArgumentParser(prog = os.path.basename(sys.argv[0]))
+    parser.add_argument(
+        'sizes', nargs = '*', type = parse_size, default = [parse_size(x) for x in SIZES],
+        help = f'program sizes, in bytes, K/M suffixes accepted (default: {" ".join(SIZES)})',
+    )
+    parser.add_argument(
+        '--shape', action = 'append', choices = SHAPES, default = None,
+        help = 'shapes of programs to benchmark (repeatable, default: all)',
+    )
+    parser.add_argument(
+        '--allocator', action = 'append', choices = list(bxregalloc.ALLOCATORS), default = None,
+        help = 'allocators to compare (repeatable, default: all)',
+    )
+    parser.add_argument(
+        '--seed', type = int, default = 0,
+        help = 'random seed (default: 0)',
+    )
+    parser.add_argument(
+        '--depth', type = int, default = 8,
+        help = 'nesting depth of the nested shape (default: 8)',
+    )
+    parser.add_argument(
+        '--length', type = int, default = 64,
+        help = 'number of operators per expression of the exprs shape (default: 64)',
+    )
+    parser.add_argument(
+        '--parser', default = 'lalr', choices = ('lalr', 'pratt'),
+        help = 'parser backend (default: lalr)',
+    )
+    parser.add_argument(
+        '--lexer', default = 'ply', choices = ('ply', 'scan'),
+        help = 'lexer backend (default: ply)',
+    )
+    args = parser.parse_args()
+
+    allocators = args.allocator or list(bxregalloc.ALLOCATORS)
+
+    for shape in args.shape or SHAPES:
+        for size in sorted(args.sizes):
+            prgm = generate(shape, size, args.seed, depth = args.depth, length = args.length)
+
+            try:
+                procs = procedures(prgm, args.parser, args.lexer)
+            except Exception as e:
+                print(f'== shape: {shape}, {size >> 10}Ki: {type(e).__name__}\n')
+                continue
+
+            if procs is None:
+                print(f'== shape: {shape}, {size >> 10}Ki: rejected\n')
+                continue
+
+            rows = { 'none': measure(procs, None) }
+            for allocator in allocators:
+                rows[allocator] = measure(procs, allocator)
+
+            report(shape, size, procs, rows)
+
+# --------------------------------------------------------------------
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,235 @@
+#! /usr/bin/env python3
+
+# --------------------------------------------------------------------
+# Speed of the code generated by bxc, on a corpus of compute kernels
+
+# --------------------------------------------------------------------
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess as sp
+import sys
+import tempfile
+import time
+
+ROOT    = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+KERNELS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kernels')
+
+# ====================================================================
+# A setting is a named set of bxc.py options, by default one per
+# optimisation level. A kernel that does not compile, or whose output
+# differs from the one under the first setting (-O0, the reference), is
+# reported as such instead of being timed.
+#
+# Results are written as JSON, and can be compared with the ones of an
+# earlier run (e.g. of another commit) with --compare.
+
+SETTINGS = {
+    'O0': ['-O0'],
+    'O1': ['-O1'],
+    'O2': ['-O2'],
+}
+
+# A kernel is flagged when its best wall time grows by more than this
+# factor relative to the compared results (the minimum being the least
+# noisy statistic).
+THRESHOLD = 1.05
+
+# --------------------------------------------------------------------
+def build(kernel: str, flags: list[str], outdir: str) -> tuple[str | None, str]:
+    result = sp.run(
+        [sys.executable, os.path.join(ROOT, 'bxc.py'),
+         '--no-server', '--no-cache', '--outdir', outdir, *flags, kernel],
+        stdout = sp.PIPE, stderr = sp.STDOUT, text = True,
+    )
+    exe = os.path.join(outdir, os.path.splitext(os.path.basename(kernel))[0] + '.exe')
+    return (exe if result.returncode == 0 else None), result.stdout
+
+# --------------------------------------------------------------------
+def run(exe: str) -> tuple[dict, str]:
+    """Run `exe` once and return its wall time, user/sys times and max
+    RSS, along with its output."""
+
+    with tempfile.TemporaryFile('w+') as output:
+        start = time.perf_counter()
+        proc  = sp.Popen([exe], stdout = output, stderr = sp.STDOUT)
+
+        # wait4 gives the resource usage of this very child, whereas
+        # getrusage(RUSAGE_CHILDREN) accumulates over all the children.
+        _, status, usage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+
+        output.seek(0)
+        stdout = output.read()
+
+    if proc.returncode != 0:
+        stdout += f'[exit code {proc.returncode}]\n'
+
+    return dict(
+        wall   = wall,
+        user   = usage.ru_utime,
+        sys    = usage.ru_stime,
+        maxrss = usage.ru_maxrss,       # KiB on Linux
+    ), stdout
+
+# --------------------------------------------------------------------
+def summary(samples: list[dict]) -> dict:
+    return {
+        key: dict(
+            min    = min(x[key] for x in samples),
+            median = statistics.median(x[key] for x in samples),
+        )
+        for key in ('wall', 'user', 'sys', 'maxrss')
+    }
+
+# --------------------------------------------------------------------
+def revision() -> str | None:
+    try:
+        result = sp.run(
+            ['git', 'describe', '--always', '--dirty'], cwd = ROOT,
+            stdout = sp.PIPE, stderr = sp.DEVNULL, text = True,
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+# --------------------------------------------------------------------
+def bench(kernels: list[str], settings: dict[str, list[str]], repeat: int) -> dict:
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for kernel in kernels:
+            name     = os.path.splitext(os.path.basename(kernel))[0]
+            expected = None
+
+            for setting, flags in settings.items():
+                outdir = os.path.join(tmp, setting)
+                entry  = results.setdefault(name, {})[setting] = dict(flags = flags)
+
+                exe, diagnostics = build(kernel, flags, outdir)
+
+                if exe is None:
+                    entry['status'] = 'compile-error'
+                    entry['log']    = diagnostics
+                    continue
+
+                samples = []
+                for _ in range(repeat):
+                    sample, stdout = run(exe)
+                    samples.append(sample)
+
+                expected = stdout if expected is None else expected
+
+                if stdout != expected:
+                    entry['status'] = 'wrong-output'
+                    entry['log']    = stdout
+                    continue
+
+                entry['status']  = 'ok'
+                entry['samples'] = samples
+                entry['summary'] = summary(samples)
+
+    return dict(
+        revision = revision(),
+        date     = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec = 'seconds'),
+        host     = platform.node(),
+        platform = platform.platform(),
+        repeat   = repeat,
+        results  = results,
+    )
+
+# --------------------------------------------------------------------
+def report(data: dict, baseline: dict | None = None) -> bool:
+    """Print the results in `data`, compared to the ones of `baseline`
+    if given. Returns whether no regression has been found."""
+
+    ok = True
+
+    print(f'revision: {data["revision"]}' + (f' (vs. {baseline["revision"]})' if baseline else ''))
+    print(f'{"kernel":<14} {"setting":<12} {"wall (s)":>9} {"user (s)":>9} {"sys (s)":>8} {"maxrss (KiB)":>13}')
+
+    for name, settings in data['results'].items():
+        for setting, entry in settings.items():
+            if entry['status'] != 'ok':
+                print(f'{name:<14} {setting:<12} {entry["status"]}')
+                continue
+
+            s    = entry['summary']
+            line = (
+                f'{name:<14} {setting:<12} {s["wall"]["median"]:>9.4f} {s["user"]["median"]:>9.4f} '
+                f'{s["sys"]["median"]:>8.4f} {s["maxrss"]["median"]:>13.0f}'
+            )
+
+            try:
+                old = baseline['results'][name][setting]['summary']
+            except (KeyError, TypeError):
+                old = None
+
+            if old is not None:
+                ratio = s['wall']['min'] / old['wall']['min']
+                line += f'  {ratio:.3f}x'
+                if ratio > THRESHOLD:
+                    line += '  <-- regression'
+                    ok = False
+
+            print(line)
+
+    return ok
+
+# --------------------------------------------------------------------
+def _main():
+    parser = argparse.ArgumentParser(prog = os.path.basename(sys.argv[0]))
+    parser.add_argument(
+        'kernels', nargs = '*',
+        help = 'BX kernels to run (default: all the kernels in bench/kernels)',
+    )
+    parser.add_argument(
+        '--setting', action = 'append', default = None, metavar = 'NAME=FLAGS',
+        help = f'named set of bxc.py options (repeatable, default: {", ".join(SETTINGS)})',
+    )
+    parser.add_argument(
+        '--repeat', type = int, default = 5,
+        help = 'number of runs of each executable (default: 5)',
+    )
+    parser.add_argument(
+        '--json', default = None, metavar = 'FILE',
+        help = 'write the results as JSON to FILE',
+    )
+    parser.add_argument(
+        '--compare', default = None, metavar = 'FILE',
+        help = 'compare with the JSON results in FILE, exiting with 1 on regressions',
+    )
+    args = parser.parse_args()
+
+    kernels = args.kernels or sorted(
+        os.path.join(KERNELS, x) for x in os.listdir(KERNELS) if x.endswith('.bx')
+    )
+
+    settings = dict(SETTINGS)
+    if args.setting:
+        settings = {}
+        for setting in args.setting:
+            name, _, flags = setting.partition('=')
+            settings[name] = flags.split()
+
+    data = bench(kernels, settings, max(1, args.repeat))
+
+    if args.json is not None:
+        with open(args.json, 'w') as stream:
+            json.dump(data, stream, indent = 2)
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare, 'r') as stream:
+            baseline = json.load(stream)
+
+    if not report(data, baseline):
+        exit(1)
+
+# --------------------------------------------------------------------
+if __name__ == '__main__':
+    _main()
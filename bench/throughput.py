@@ -0,0 +1,166 @@
+#! /usr/bin/env python3
+
+# --------------------------------------------------------------------
+# Throughput and scaling of each compiler phase on synthetic programs
+
+# --------------------------------------------------------------------
+import argparse
+import contextlib as cl
+import gc
+import io
+import math
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bxlib import bxdriver
+from bxlib import bxtiming
+
+from bxgen import SHAPES, generate, parse_size
+
+# ====================================================================
+SIZES = ['1K', '4K', '16K', '64K', '256K', '1M']
+
+PHASES = ('parse', 'pretype', 'tycheck', 'globals', 'mm', 'cfg', 'regalloc', 'asmgen', 'runtime', 'gcc')
+
+# A phase whose time grows faster than size^SUPERLINEAR is flagged.
+# Timings under MIN_TIME seconds are too noisy to be fitted.
+SUPERLINEAR = 1.15
+MIN_TIME    = 0.005
+
+# --------------------------------------------------------------------
+def run(prgm: str, parser: str, lexer: str, link: bool, memory: bool) -> tuple[dict, str]:
+    """Compile `prgm` and return the time spent in each phase, along
+    with the outcome of the compilation."""
+
+    outcome = 'ok'
+    output  = io.StringIO()
+
+    gc.collect()
+
+    with tempfile.TemporaryDirectory() as tmp, \
+         cl.redirect_stdout(output), cl.redirect_stderr(output), \
+         bxtiming.timing('<bench>', memory) as timer:
+
+        try:
+            asm = bxdriver.compile_source(prgm, parser, lexer)
+            if asm is None:
+                outcome = 'rejected'
+            elif link and not bxdriver.build([asm], os.path.join(tmp, 'prgm')):
+                outcome = 'gcc failed'
+        except Exception as e:
+            # The phase that failed is the last one that has been recorded,
+            # and its time is not meaningful.
+            where   = timer.events.pop()['name'] if timer.events else 'parse'
+            outcome = f'{type(e).__name__} in {where}'
+
+    times = {}
+    for event in timer.events:
+        times[event['name']] = times.get(event['name'], 0) + event['wall'] / 1e6
+
+    return times, outcome
+
+# --------------------------------------------------------------------
+def slope(points: list[tuple[int, float]]) -> float | None:
+    """Least-squares slope of log(time) against log(size)."""
+
+    points = [(math.log(n), math.log(t)) for n, t in points if t >= MIN_TIME]
+
+    if len(points) < 2:
+        return None
+
+    mx = sum(x for x, _ in points) / len(points)
+    my = sum(y for _, y in points) / len(points)
+    dx = sum((x - mx) ** 2 for x, _ in points)
+
+    if dx == 0:
+        return None
+    return sum((x - mx) * (y - my) for x, y in points) / dx
+
+# --------------------------------------------------------------------
+def report(shape: str, rows: list[tuple[int, dict, str]]):
+    phases = [x for x in PHASES if any(x in times for _, times, _ in rows)]
+
+    print(f'== shape: {shape}')
+    print(f'{"size":>10} ' + ' '.join(f'{x:>9}' for x in phases) + f' {"total":>9} {"KiB/s":>9}  outcome')
+
+    for size, times, outcome in rows:
+        total = sum(times.values())
+        print(
+            f'{size >> 10:>8}Ki ' +
+            ' '.join(f'{times[x]:>9.4f}' if x in times else f'{"-":>9}' for x in phases) +
+            f' {total:>9.4f} {(size >> 10) / total if total else 0:>9.1f}  {outcome}'
+        )
+
+    print('scaling (time ~ size^k):')
+
+    for phase in phases:
+        k = slope([(size, times[phase]) for size, times, _ in rows if phase in times])
+        if k is None:
+            print(f'  {phase:<9} -')
+        else:
+            flag = '  <-- superlinear' if k > SUPERLINEAR else ''
+            print(f'  {phase:<9} k = {k:.2f}{flag}')
+
+    print()
+
+# --------------------------------------------------------------------
+def _main():
+    parser = argparse.ArgumentParser(prog = os.path.basename(sys.argv[0]))
+    parser.add_argument(
+        'sizes', nargs = '*', type = parse_size, default = [parse_size(x) for x in SIZES],
+        help = f'program sizes, in bytes, K/M suffixes accepted (default: {" ".join(SIZES)}; up to 50M)',
+    )
+    parser.add_argument(
+        '--shape', action = 'append', choices = SHAPES, default = None,
+        help = 'shapes of programs to benchmark (repeatable, default: all)',
+    )
+    parser.add_argument(
+        '--depth', type = int, default = 8,
+        help = 'nesting depth of the nested shape (default: 8)',
+    )
+    parser.add_argument(
+        '--length', type = int, default = 64,
+        help = 'number of operators per expression of the exprs shape (default: 64)',
+    )
+    parser.add_argument(
+        '--parser', default = 'lalr', choices = ('lalr', 'pratt'),
+        help = 'parser backend (default: lalr)',
+    )
+    parser.add_argument(
+        '--lexer', default = 'ply', choices = ('ply', 'scan'),
+        help = 'lexer backend (default: ply)',
+    )
+    parser.add_argument(
+        '--repeat', type = int, default = 1,
+        help = 'number of runs per program, the best time of each phase being kept (default: 1)',
+    )
+    parser.add_argument(
+        '--link', action = 'store_true',
+        help = 'also time the assembly and the linking with gcc',
+    )
+    parser.add_argument(
+        '--memory', action = 'store_true',
+        help = 'trace memory allocations (slower)',
+    )
+    args = parser.parse_args()
+
+    bxdriver.warm(args.parser, args.lexer)
+
+    for shape in args.shape or SHAPES:
+        rows = []
+        for size in sorted(args.sizes):
+            prgm  = generate(shape, size, depth = args.depth, length = args.length)
+            times = {}
+            for _ in range(max(1, args.repeat)):
+                runtimes, outcome = run(prgm, args.parser, args.lexer, args.link, args.memory)
+                for phase, elapsed in runtimes.items():
+                    times[phase] = min(times.get(phase, elapsed), elapsed)
+            rows.append((len(prgm), times, outcome))
+        report(shape, rows)
+
+# --------------------------------------------------------------------
+if __name__ == '__main__':
+    _main()
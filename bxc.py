@@ -5,18 +5,16 @@
 
 # --------------------------------------------------------------------
 import argparse
+import concurrent.futures as cf
+import functools as ft
 import os
-import subprocess as sp
 import sys
 
-from bxlib.bxast        import *
-from bxlib.bxerrors     import Reporter, DefaultReporter
-from bxlib.bxparser     import Parser
-from bxlib.bxmm         import MM
-from bxlib.bxtychecker  import check as tycheck
-from bxlib.bxasmgen     import AsmGen
-from bxlib.bxtac        import *
-from bxlib.bxcfg        import tac2cfg, cfg2tac, uce, jthreading
+from bxlib import bxclient
+
+# The compiler proper (PLY, the front-end and back-ends) is only imported
+# when compiling locally: a client of the compile server does not need
+# it, and importing it is what the server is here to save.
 
 # ====================================================================
 # Parse command line arguments
@@ -24,65 +22,249 @@ from bxlib.bxcfg        import tac2cfg, cfg2tac, uce, jthreading
 def parse_args():
     parser = argparse.ArgumentParser(prog = os.path.basename(sys.argv[0]))
 
-    parser.add_argument('input', help = 'input file (.bx)')
+    parser.add_argument(
+        'input', nargs = '*',
+        help = 'input files (.bx), or directories to search for .bx files',
+    )
+
+    parser.add_argument(
+        '-j', '--jobs', type = int, default = 1,
+        help = 'number of files compiled in parallel (0: one per core, default: 1)',
+    )
+
+    parser.add_argument(
+        '--lower-jobs', type = int, default = 1,
+        help = 'number of processes lowering the procedures of a file in parallel,'
+               ' when compiling locally (0: one per core, default: 1)',
+    )
+
+    parser.add_argument(
+        '--outdir', default = '.',
+        help = 'output directory (default: current directory)',
+    )
+
+    parser.add_argument(
+        '--lexer', default = 'ply', choices = ('ply', 'scan'),
+        help = 'lexer backend (default: ply)',
+    )
+
+    parser.add_argument(
+        '--parser', default = 'lalr', choices = ('lalr', 'pratt'),
+        help = 'parser backend (default: lalr)',
+    )
+
+    parser.add_argument(
+        '-O', dest = 'optlevel', type = int, default = 1, choices = (0, 1, 2),
+        help = 'optimisation level: 0 keeps all the temporaries on the stack,'
+               ' 1 allocates them to registers by linear scan, 2 by graph'
+               ' colouring with coalescing of copies (default: 1)',
+    )
+
+    parser.add_argument(
+        '--save-temps', action = 'store_true',
+        help = 'write the assembly to a .s file next to the executable, instead of'
+               ' piping it into the assembler',
+    )
+
+    parser.add_argument(
+        '--time-passes', action = 'store_true',
+        help = 'report the wall time, CPU time and memory peak of each compiler pass',
+    )
+
+    parser.add_argument(
+        '--trace-passes', metavar = 'FILE', default = None,
+        help = 'like --time-passes, also exporting the timings as a Chrome trace to FILE',
+    )
+
+    parser.add_argument(
+        '--cache-dir', default = None,
+        help = 'directory of the build artifacts cache (default: artifacts/ in the bxc cache directory)',
+    )
+
+    parser.add_argument(
+        '--cache-size', type = int, default = 256,
+        help = 'maximum size of the build artifacts cache, in MiB (default: 256)',
+    )
+
+    parser.add_argument(
+        '--no-cache', action = 'store_true',
+        help = 'do not use the build artifacts cache',
+    )
+
+    parser.add_argument(
+        '--server', action = 'store_true',
+        help = 'run a resident compile server, with --jobs workers, that later invocations forward to',
+    )
+
+    parser.add_argument(
+        '--stop-server', action = 'store_true',
+        help = 'stop the running compile server',
+    )
+
+    parser.add_argument(
+        '--no-server', action = 'store_true',
+        help = 'compile locally, even if a compile server is running',
+    )
+
+    parser.add_argument(
+        '--socket', default = None,
+        help = f'socket of the compile server (default: {bxclient.socket_path()})',
+    )
 
     aout = parser.parse_args()
 
-    if os.path.splitext(aout.input)[1].lower() != '.bx':
-        parser.error('input filename must end with the .bx extension')
+    if aout.server and aout.input:
+        parser.error('no input files may be given with --server')
+
+    if not aout.input and not (aout.server or aout.stop_server):
+        parser.error('the following arguments are required: input')
+
+    # (source, output basename) pairs. The sources found in a directory
+    # keep their relative path below the output directory.
+    aout.files = []
+
+    for path in aout.input:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].lower() == '.bx':
+                        source = os.path.join(root, name)
+                        stem   = os.path.splitext(os.path.relpath(source, path))[0]
+                        aout.files.append((source, os.path.join(aout.outdir, stem)))
+
+        elif os.path.splitext(path)[1].lower() != '.bx':
+            parser.error('input filename must end with the .bx extension')
+
+        else:
+            stem = os.path.basename(os.path.splitext(path)[0])
+            aout.files.append((path, os.path.join(aout.outdir, stem)))
+
+    outputs = [x[1] for x in aout.files]
+    if len(set(outputs)) != len(outputs):
+        parser.error('several input files would have the same output files')
+
+    if aout.jobs < 0:
+        parser.error('the number of jobs must be non-negative')
+
+    if aout.lower_jobs < 0:
+        parser.error('the number of lowering jobs must be non-negative')
+
+    aout.lower_jobs = aout.lower_jobs or os.cpu_count()
+
+    if aout.cache_size < 0:
+        parser.error('the size of the cache must be non-negative')
+
+    # The passes are timed in the compiling process: no compile server.
+    if aout.trace_passes is not None:
+        aout.time_passes = True
+
+    if aout.time_passes:
+        aout.no_server = True
+
+    if aout.cache_dir is not None:
+        aout.cache_dir = os.path.abspath(aout.cache_dir)
 
     return aout
 
 # ====================================================================
 # Main entry point
 
+def _local(args, timed: list):
+    from bxlib import bxdriver
+    from bxlib.bxbuildcache import BuildCache
+
+    cache = None
+
+    if not args.no_cache:
+        cache = BuildCache(args.cache_dir, args.cache_size << 20)
+
+    jobs = [
+        (source, basename, args.parser, args.lexer, cache,
+         args.lower_jobs, args.save_temps, args.optlevel)
+        for source, basename in args.files
+    ]
+
+    job = ft.partial(bxdriver.compile_job, timed = args.time_passes)
+
+    if args.jobs == 1 or len(jobs) == 1:
+        bxdriver.warm(args.parser, args.lexer)
+        results = map(job, jobs)
+        pool    = None
+    else:
+        pool = cf.ProcessPoolExecutor(
+            max_workers = args.jobs or os.cpu_count(),
+            initializer = bxdriver.warm,
+            initargs    = (args.parser, args.lexer),
+        )
+        results = pool.map(job, jobs)
+
+    try:
+        for (source, *_), (ok, output, _, events) in zip(jobs, results):
+            if events is not None:
+                timed.append((source, events))
+            yield ok, output
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+# --------------------------------------------------------------------
 def _main():
     args = parse_args()
 
-    try:
-        with open(args.input, 'r') as stream:
-            prgm = stream.read()
+    if args.stop_server:
+        if bxclient.request(dict(command = 'stop'), args.socket) is None:
+            print('bxc: no compile server is running', file = sys.stderr)
+            exit(1)
 
-    except IOError as e:
-        print(f'cannot read input file {args.input}: {e}')
-        exit(1)
+    if args.server:
+        from bxlib import bxserver
+        bxserver.serve(args.socket, args.jobs, args.parser, args.lexer)
+        return
 
-    reporter = DefaultReporter(source = prgm)
-    prgm = Parser(reporter = reporter).parse(prgm)
+    files = args.files
 
-    if prgm is None:
-        exit(1)
+    if not files:
+        return
 
-    if not tycheck(prgm, reporter = reporter):
-        exit(1)
+    results = None
+    timed   = []
 
-    tac = MM.mm(prgm)
+    if not args.no_server:
+        results = bxclient.compile(
+            files, args.parser, args.lexer,
+            cache      = None if args.no_cache else (args.cache_dir, args.cache_size << 20),
+            save_temps = args.save_temps,
+            optlevel   = args.optlevel,
+            path       = args.socket,
+        )
 
-    for decl in tac:
-        match decl:
-            case TACProc(tac = ptac):
-                # We here do TAC -> CFG -> JTHREADING -> UCE -> TAC
-                # Other CFG-based optimizations should be inserted here
-                decl.tac = cfg2tac(uce(jthreading(tac2cfg(ptac))))
+    if results is None:
+        results = _local(args, timed)
 
-    abk = AsmGen.get_backend('x64-linux')
-    asm = abk.lower(tac)
+    nfailed = 0
 
-    basename = os.path.splitext(args.input)[0]
-    basename = os.path.basename(basename)
+    for (source, _), (ok, output) in zip(files, results):
+        nfailed += not ok
+        if len(files) > 1 and output:
+            print(f'==> {source}', file = sys.stderr)
+        print(output, end = '', file = sys.stderr)
 
-    try:
-        with open(f'{basename}.s', 'w') as stream:
-            stream.write(asm)
+    if len(files) > 1:
+        print(f'{len(files) - nfailed} file(s) compiled, {nfailed} failed', file = sys.stderr)
 
-    except IOError as e:
-        print(f'cannot write outpout file {args.output}: {e}')
-        exit(1)
+    if args.trace_passes is not None:
+        from bxlib.bxtiming import chrome_trace
 
-    bxruntime = os.path.join(os.path.dirname(__file__), 'bxlib', 'bxruntime.c')
+        try:
+            with open(args.trace_passes, 'w') as stream:
+                stream.write(chrome_trace(timed))
+        except IOError as e:
+            print(f'cannot write trace file {args.trace_passes}: {e}', file = sys.stderr)
+            exit(1)
 
-    sp.call(['gcc', '-g', '-c', '-o', f'{basename}.o', f'{basename}.s'])
-    sp.call(['gcc', '-g', '-o', f'{basename}.exe', bxruntime, f'{basename}.o'])
+    if nfailed:
+        exit(1)
 
 # --------------------------------------------------------------------
 if __name__ == '__main__':
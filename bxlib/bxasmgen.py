@@ -1,7 +1,8 @@
 # --------------------------------------------------------------------
 import abc
 
-from .bxtac import *
+from .bxtac      import *
+from .bxregalloc import Allocation, Registers, allocate
 
 # --------------------------------------------------------------------
 class AsmGen(abc.ABC):
@@ -12,6 +13,8 @@ class AsmGen(abc.ABC):
         self._tparams = dict()
         self._temps   = dict()
         self._asm     = []
+        self._regs    = dict()  # Temporaries allocated to registers, dict[str, str]
+        self._slots   = dict()  # Shared stack slots of temporaries, dict[str, int]
         self._stack_offset = 0  # Tracks the stack offset in 8-byte units
         
     def _temp(self, temp):
@@ -19,16 +22,20 @@ class AsmGen(abc.ABC):
             return self._format_temp(temp[1:])
         if temp in self._tparams:
             return self._format_param(self._tparams[temp])
+        if temp in self._regs:
+            return self._regs[temp]
+        if temp in self._slots:
+            return self._format_temp(self._slots[temp])
     
         var_index = self._temps.get(temp)
         var_size = self._var_sizes.get(temp) 
         
-        if not var_index and not var_size:    
+        if var_index is None and not var_size:    
             self._stack_offset += 1 
             self._temps[temp] = self._stack_offset - 1
             output = self._format_temp(self._stack_offset - 1)  
             
-        elif not var_index and var_size is not None:
+        elif var_index is None and var_size is not None:
             shifted_size = var_size >> 3  # RS
             self._stack_offset += shifted_size
             self._temps[temp] = self._stack_offset - 1
@@ -85,11 +92,35 @@ class AsmGen(abc.ABC):
 class AsmGen_x64_Linux(AsmGen):
     PARAMS = ['%rdi', '%rsi', '%rdx', '%rcx', '%r8', '%r9']
 
+    # Allocatable registers. %rax, %rcx and %rdx are used by calls, by
+    # multiplications, divisions and shifts, and %r11 is the scratch
+    # register of all the instructions: none of them is allocated.
+    CALLER_SAVED = ['%rsi', '%rdi', '%r8', '%r9', '%r10']
+    CALLEE_SAVED = ['%rbx', '%r12', '%r13', '%r14', '%r15']
+
     def __init__(self):
         super().__init__()
         self._params = []
         self._endlbl = None
 
+    @classmethod
+    def registers(cls) -> Registers:
+        def clobbers(instr: TAC) -> frozenset[str]:
+            if instr.opcode in ('call', 'print'):
+                return frozenset(cls.CALLER_SAVED)
+            return frozenset()
+
+        return Registers(cls.CALLER_SAVED, cls.CALLEE_SAVED, clobbers)
+
+    @classmethod
+    def allocate(cls, tac: TACProc, allocator: str) -> Allocation:
+        # Arrays, and the variables whose address is taken, stay in memory.
+        exclude  = set(tac.var_sizes)
+        exclude |= {
+            x.arguments[0] for x in tac.tac if isinstance(x, TAC) and x.opcode == 'ref'
+        }
+        return allocate(tac, cls.registers(), allocator, exclude)
+
     def _format_temp(self, index):
         if isinstance(index, str):
             return f'{index}(%rip)'
@@ -98,17 +129,54 @@ class AsmGen_x64_Linux(AsmGen):
     def _format_param(self, index):
         return f'{8*(index+2)}(%rbp)'
 
+    @staticmethod
+    def _is_reg(operand):
+        return operand.startswith('%')
+
+    def _emit_move(self, src, dst):
+        if src == dst:
+            return
+        if self._is_reg(src) or self._is_reg(dst):
+            self._emit('movq', src, dst)
+        else:
+            self._emit('movq', src, '%r11')
+            self._emit('movq', '%r11', dst)
+
+    def _emit_moves(self, moves):
+        # Parallel moves, e.g. of the arguments of a call to their
+        # registers, when some of them are held in these very registers.
+        # Moves are emitted once their destination is not read by any
+        # pending move, and cycles are broken through %r11.
+        moves = [(src, dst) for src, dst in moves if src != dst]
+
+        while moves:
+            for i, (src, dst) in enumerate(moves):
+                if all(dst != x for x, _ in moves):
+                    self._emit_move(src, dst)
+                    del moves[i]
+                    break
+            else:
+                dst = moves[0][1]
+                self._emit('movq', dst, '%r11')
+                moves = [('%r11' if x == dst else x, y) for x, y in moves]
+
     def _emit_const(self, ctt, dst):
         self._emit('movq', f'${ctt}', self._temp(dst))
 
     def _emit_copy(self, src, dst):
-        self._emit('movq', self._temp(src), '%r11')
-        self._emit('movq', '%r11', self._temp(dst))
+        self._emit_move(self._temp(src), self._temp(dst))
 
     def _emit_alu1(self, opcode, src, dst):
-        self._emit('movq', self._temp(src), '%r11')
+        src, dst = self._temp(src), self._temp(dst)
+
+        if self._is_reg(dst):
+            self._emit_move(src, dst)
+            self._emit(opcode, dst)
+            return
+
+        self._emit('movq', src, '%r11')
         self._emit(opcode, '%r11')
-        self._emit('movq', '%r11', self._temp(dst))
+        self._emit('movq', '%r11', dst)
 
     def _emit_neg(self, src, dst):
         self._emit_alu1('negq', src, dst)
@@ -116,15 +184,33 @@ class AsmGen_x64_Linux(AsmGen):
     def _emit_not(self, src, dst):
         self._emit_alu1('notq', src, dst)
 
-    def _emit_alu2(self, opcode, op1, op2, dst):
-        self._emit('movq', self._temp(op1), '%r11')
-        self._emit(opcode, self._temp(op2), '%r11')
-        self._emit('movq', '%r11', self._temp(dst))
+    def _emit_alu2(self, opcode, op1, op2, dst, commutative = False):
+        op1, op2, dst = self._temp(op1), self._temp(op2), self._temp(dst)
+
+        # The destination can share the register of a dead operand.
+        if commutative and dst == op2:
+            op1, op2 = op2, op1
+
+        if self._is_reg(dst) and (dst != op2 or dst == op1):
+            self._emit_move(op1, dst)
+            self._emit(opcode, op2, dst)
+            return
+
+        self._emit('movq', op1, '%r11')
+        self._emit(opcode, op2, '%r11')
+        self._emit('movq', '%r11', dst)
 
     def _emit_add(self, op1, op2, dst):
-        self._emit_alu2('addq', op1, op2, dst)
+        self._emit_alu2('addq', op1, op2, dst, commutative = True)
 
     def _emit_sub(self, op1, op2, dst):
+        x, y, z = self._temp(op1), self._temp(op2), self._temp(dst)
+
+        if self._is_reg(z) and z == y != x:
+            # z = x - z = -z + x
+            self._emit('negq', z)
+            self._emit('addq', x, z)
+            return
         self._emit_alu2('subq', op1, op2, dst)
 
     def _emit_mul(self, op1, op2, dst):
@@ -145,13 +231,13 @@ class AsmGen_x64_Linux(AsmGen):
         self._emit('movq', '%rdx', self._temp(dst))
 
     def _emit_and(self, op1, op2, dst):
-        self._emit_alu2('andq', op1, op2, dst)
+        self._emit_alu2('andq', op1, op2, dst, commutative = True)
 
     def _emit_or(self, op1, op2, dst):
-        self._emit_alu2('orq', op1, op2, dst)
+        self._emit_alu2('orq', op1, op2, dst, commutative = True)
 
     def _emit_xor(self, op1, op2, dst):
-        self._emit_alu2('xorq', op1, op2, dst)
+        self._emit_alu2('xorq', op1, op2, dst, commutative = True)
 
     def _emit_shl(self, op1, op2, dst):
         self._emit('movq', self._temp(op1), '%r11')
@@ -166,8 +252,8 @@ class AsmGen_x64_Linux(AsmGen):
         self._emit('movq', '%r11', self._temp(dst))
 
     def _emit_print(self, arg):
+        self._emit_move(self._temp(arg), '%rsi')
         self._emit('leaq', '.lprintfmt(%rip)', '%rdi')
-        self._emit('movq', self._temp(arg), '%rsi')
         self._emit('xorq', '%rax', '%rax')
         self._emit('callq', 'printf@PLT')
 
@@ -203,17 +289,20 @@ class AsmGen_x64_Linux(AsmGen):
     def _emit_call(self, lbl, arg, ret = None):
         assert(arg == len(self._params))
 
-        for i, x in enumerate(self._params[:6]):
-            self._emit('movq', self._temp(x), self.PARAMS[i])
-
         qarg = 0 if arg <= 6 else arg - 6
 
         if qarg & 0x1:
             self._emit('subq', '$8', '%rsp')
 
+        # The arguments passed on the stack are pushed first, as the ones
+        # passed in registers may overwrite the registers they are held in.
         for x in self._params[6:][::-1]:
             self._emit('pushq', self._temp(x))
 
+        self._emit_moves([
+            (self._temp(x), self.PARAMS[i]) for i, x in enumerate(self._params[:6])
+        ])
+
         self._emit('callq', lbl)
 
         if qarg > 0:
@@ -229,65 +318,8 @@ class AsmGen_x64_Linux(AsmGen):
             self._emit('movq', self._temp(ret), '%rax')
         self._emit('jmp', self._endlbl)
 
-
-    # NEW FUNCTIONS FOR ASSIGNMENT
-    def _emit_memory_array_copy(self, target_temp, src_temp, offset):
-        
-        self._emit("movq", self._temp(src_temp), "%r13")
-        self._emit("movq", self._temp(target_temp), "%r14")
-        self._emit("movq", f"${offset}", "%r15")
-
-        self._emit("movq", "$0", "%rax") # Zero out %rax when emitting "callq"
-        self._emit("callq", "copy_array", "%r14", "%r13", "%r15")
-
-    def _emit_memory_load(self, address, target_register):
-        
-        (mem_register, offset) = address if isinstance(address, tuple) else (address, 0)
-        destination = f"{offset}({mem_register})" if offset != 0 else f"({mem_register})"
-
-        self._emit("movq", self._temp(destination), '%r8')
-        self._emit("addq", f"${offset}", "%r8")
-        self._emit("movq", "(%r8)", "%r9")
-        self._emit("movq", "%r9", self._temp(target_register))
-        
-    def _emit_memory_store(self, input_data, target_address):
-        
-        (mem_register, offset) = target_address if isinstance(target_address, tuple) else (target_address, 0)
-        destination = f"{offset}({mem_register})" if offset != 0 else f"({mem_register})"
-        
-        self._emit("movq", self._temp(destination), '%r10')
-        self._emit("addq", f"${offset}", "%r10")
-        self._emit("movq", self._temp(input_data), "%r11")
-        self._emit("movq", "%r11", "(%r10)")
-        
-    def _emit_memory_pointer(self, source_temp, target_temp):
-
-        self._emit("leaq", self._temp(source_temp), "%r12")
-        self._emit("movq", "%r12", self._temp(target_temp))
-        
-    def _emit_memory_allocation(self, count_temp, size_temp, target_temp):
-
-        self._emit("movq", f"${size_temp}", "%rsi") # Pass first six integer/pointer params to callq
-        self._emit("movq", self._temp(count_temp), "%rdi") # Pass first six integer/pointer params to callq
-
-        self._emit("movq", "$0", "%rax")  # Zero out %rax when emitting "callq"
-        self._emit("callq", "alloc")
-        
-        self._emit("movq", "%rax", self._temp(target_temp)) # Fetch output of callq
-
-    def _emit_memory_initialization(self, target_temp, byte_count):
-        
-        self._emit("movq", f"${byte_count}", "%rsi") # Pass first six integer/pointer params to callq
-        self._emit("movq", self._temp(target_temp), "%rdi") # Pass first six integer/pointer params to callq
-
-        self._emit("movq", "$0", "%rax")  # Zero out %rax when emitting "callq"
-        self._emit("callq", "zero_out")
-        
-    # END OF ASSIGNMENT FUNCTIONS
-    
-    
     @classmethod
-    def lower1(cls, tac: TACProc | TACVar) -> list[str]:
+    def lower1(cls, tac: TACProc | TACVar, alloc: Allocation | None = None) -> list[str]:
         emitter = cls()
 
         match tac:
@@ -303,16 +335,36 @@ class AsmGen_x64_Linux(AsmGen):
                 emitter._endlbl = f'.E_{name}'
                 emitter.initialize_var_sizes(tac.var_sizes)
 
-                for i in range(min(6, len(arguments))):
-                    emitter._emit('movq', emitter.PARAMS[i], emitter._temp(arguments[i]))
+                if alloc is not None:
+                    emitter._regs  = alloc.registers
+                    emitter._slots = alloc.slots
 
+                    # The other temporaries get slots past the shared ones.
+                    emitter._stack_offset = max(alloc.slots.values(), default = -1) + 1
+
+                emitter._emit_moves([
+                    (emitter.PARAMS[i], emitter._temp(arguments[i]))
+                    for i in range(min(6, len(arguments)))
+                ])
+
+                # The arguments past the sixth are passed on the stack: the
+                # ones that got a register are loaded in it, the others are
+                # read from the frame of the caller.
                 for i, arg in enumerate(arguments[6:]):
-                    emitter._tparams[arg] = i
+                    if arg in emitter._regs:
+                        emitter._emit('movq', emitter._format_param(i), emitter._regs[arg])
+                    else:
+                        emitter._tparams[arg] = i
 
                 for instr in ptac:
                     emitter(instr)
 
-                nvars  = len(emitter._temps)
+                # The callee-saved registers that are used are saved in
+                # the frame, along with the temporaries.
+                saved = [x for x in cls.CALLEE_SAVED if x in emitter._regs.values()]
+                slots = [emitter._temp(f'.save{x}') for x in saved]
+
+                nvars  = emitter._stack_offset
                 nvars += nvars & 1
 
                 return [
@@ -322,8 +374,13 @@ class AsmGen_x64_Linux(AsmGen):
                     emitter._get_asm('pushq', '%rbp'),
                     emitter._get_asm('movq', '%rsp', '%rbp'),
                     emitter._get_asm('subq', f'${8*nvars}', '%rsp'),
+                ] + [
+                    emitter._get_asm('movq', x, slot) for x, slot in zip(saved, slots)
                 ] + emitter._asm + [
                     emitter._get_label(emitter._endlbl),
+                ] + [
+                    emitter._get_asm('movq', slot, x) for x, slot in zip(saved, slots)
+                ] + [
                     emitter._get_asm('movq', '%rbp', '%rsp'),
                     emitter._get_asm('popq', '%rbp'),
                     emitter._get_asm('retq'),
@@ -32,7 +32,7 @@ class Type(enum.Enum):
 
 
 # --------------------------------------------------------------------
-@dc.dataclass
+@dc.dataclass(slots = True)
 class Range:
     start: tuple[int, int]
     end: tuple[int, int]
@@ -42,85 +42,150 @@ class Range:
         return Range((line, column), (line, column+1))
 
 # --------------------------------------------------------------------
-@dc.dataclass
+# Compact positions: the source offsets of the first and last tokens of
+# a node, packed in a single integer. They are only turned into a Range
+# (see Lexer.range_of) when reported.
+
+def span(start: int, end: int) -> int:
+    return (start << 32) | end
+
+# --------------------------------------------------------------------
+@dc.dataclass(slots = True)
 class AST:
-    position: Opt[Range] = dc.field(kw_only = True, default = None)
+    position: Opt[Range | int] = dc.field(kw_only = True, default = None)
 
 
 # --------------------------------------------------------------------
-@dc.dataclass
+@dc.dataclass(slots = True)
 class Name(AST):
     value: str
 
 ########################################################################
 
-@dc.dataclass
-class Pointer(Type):
-    element_type: Type
-    
+# --------------------------------------------------------------------
+# Pointer and array types are hash-consed: each distinct type is built
+# exactly once, so that types are compared (and hashed) by identity and
+# their size is only computed once.
+
+class InternedType:
+    __slots__ = ('_sizeof',)
+
+    _instances = {}
+
+    @classmethod
+    def _intern(cls, *key):
+        self = InternedType._instances.get((cls,) + key)
+        if self is None:
+            self = object.__new__(cls)
+            for name, value in zip(cls.__match_args__, key):
+                setattr(self, name, value)
+            self._sizeof = None
+            InternedType._instances[(cls,) + key] = self
+        return self
+
+    def __reduce__(self):
+        return (type(self), tuple(getattr(self, x) for x in self.__match_args__))
+
+    def __repr__(self):
+        fields = ', '.join(f'{x}={getattr(self, x)!r}' for x in self.__match_args__)
+        return f'{type(self).__name__}({fields})'
+
+    def sizeof(self):
+        if self._sizeof is None:
+            self._sizeof = self._compute_sizeof()
+        return self._sizeof
+
+# --------------------------------------------------------------------
+class Pointer(InternedType):
+    __slots__      = ('element_type',)
+    __match_args__ = ('element_type',)
+
+    def __new__(cls, element_type: Type):
+        return cls._intern(element_type)
+
     def __str__(self):
         return f"{self.element_type}*"
     
-    def sizeof(self):
+    def _compute_sizeof(self):
         return 8
 
-@dc.dataclass
-class Array(Type):
-    element_type: Type
-    size: int
-    
+# --------------------------------------------------------------------
+class Array(InternedType):
+    __slots__      = ('element_type', 'size')
+    __match_args__ = ('element_type', 'size')
+
+    def __new__(cls, element_type: Type, size: int):
+        return cls._intern(element_type, size)
+
     def __str__(self):
         return f"{self.element_type}[{self.element_type}]"
 
-    def sizeof(self):
+    def _compute_sizeof(self):
         return self.size * self.element_type.sizeof()
 
 ########################################################################
 
 # --------------------------------------------------------------------
-@dc.dataclass
+# Variable bindings, as computed by name resolution (see bxresolve):
+# the name of a global, the index of a parameter or the slot number of
+# a local variable in its procedure.
+
+class Storage(enum.Enum):
+    GLOBAL = 0
+    PARAM  = 1
+    LOCAL  = 2
+
+@dc.dataclass(slots = True)
+class Binding:
+    storage: Storage
+    index: int | str
+    type_: Type | InternedType
+
+# --------------------------------------------------------------------
+@dc.dataclass(slots = True)
 class Expression(AST):
     type_: Opt[Type] = dc.field(kw_only = True, default = None)
 
 # --------------------------------------------------------------------
-@dc.dataclass
+@dc.dataclass(slots = True)
 class VarExpression(Expression):
     name: Name
+    binding: Opt[Binding] = dc.field(kw_only = True, default = None)
 
 
 # --------------------------------------------------------------------
-@dc.dataclass
+@dc.dataclass(slots = True)
 class BoolExpression(Expression):
     value: bool
 
 # --------------------------------------------------------------------
-@dc.dataclass
+@dc.dataclass(slots = True)
 class IntExpression(Expression):
     value: int
 
 ########################################################################
 ######### New classes for expression
 
-@dc.dataclass
+@dc.dataclass(slots = True)
 class NullExpression(Expression):
     type_: None
 
 
-@dc.dataclass
+@dc.dataclass(slots = True)
 class ReferenceExpression(Expression):
     value: Expression
     
 
-@dc.dataclass
+@dc.dataclass(slots = True)
 class DereferenceExpression(Expression):
     pointer_expr: Expression  # Expression that results in a pointer
 
-@dc.dataclass
+@dc.dataclass(slots = True)
 class AccessExpression(Expression):
     array_expr: Expression  # Expression to access (e.g., array or pointer)
     index: Expression         # int used as an index or key
 
-@dc.dataclass
+@dc.dataclass(slots = True)
 class AllocateExpression(Expression):
     size: Expression
     allocate_type : Type
@@ -132,95 +197,99 @@ class AllocateExpression(Expression):
 ########################################################################
 
 # --------------------------------------------------------------------
-@dc.dataclass
+@dc.dataclass(slots = True)
 class OpAppExpression(Expression):
     operator: str
     arguments: list[Expression]
 
 # --------------------------------------------------------------------
-@dc.dataclass
+@dc.dataclass(slots = True)
 class CallExpression(Expression):
     proc: Name
     arguments: list[Expression]
 
 # --------------------------------------------------------------------
-@dc.dataclass
+@dc.dataclass(slots = True)
 class PrintExpression(Expression):
     argument: Expression
 
 # --------------------------------------------------------------------
+@dc.dataclass(slots = True)
 class Statement(AST):
     pass
 
 # --------------------------------------------------------------------
-@dc.dataclass
+@dc.dataclass(slots = True)
 class VarDeclStatement(Statement):
     name: Name
     init: Expression
     type_: Type
+    binding: Opt[Binding] = dc.field(kw_only = True, default = None)
 
 # --------------------------------------------------------------------
-@dc.dataclass
+@dc.dataclass(slots = True)
 class AssignStatement(Statement):
     lhs: Name
     rhs: Expression
+    binding: Opt[Binding] = dc.field(kw_only = True, default = None)
 
 # --------------------------------------------------------------------
-@dc.dataclass
+@dc.dataclass(slots = True)
 class ExprStatement(Statement):
     expression: Expression
 
 # --------------------------------------------------------------------
-@dc.dataclass
+@dc.dataclass(slots = True)
 class PrintStatement(Statement):
     value: Expression
 
 # --------------------------------------------------------------------
-@dc.dataclass
+@dc.dataclass(slots = True)
 class BlockStatement(Statement):
     body: list[Statement]
 
 # --------------------------------------------------------------------
-@dc.dataclass
+@dc.dataclass(slots = True)
 class IfStatement(Statement):
     condition: Expression
     then: Statement
     else_: Opt[Statement] = None
 
 # --------------------------------------------------------------------
-@dc.dataclass
+@dc.dataclass(slots = True)
 class WhileStatement(Statement):
     condition: Expression
     body: Statement
 
 # --------------------------------------------------------------------
-@dc.dataclass
+@dc.dataclass(slots = True)
 class BreakStatement(Statement):
     pass
 
 # --------------------------------------------------------------------
-@dc.dataclass
+@dc.dataclass(slots = True)
 class ContinueStatement(Statement):
     pass
 
 # --------------------------------------------------------------------
-@dc.dataclass
+@dc.dataclass(slots = True)
 class ReturnStatement(Statement):
     expr: Opt[Expression]
 
 # --------------------------------------------------------------------
+@dc.dataclass(slots = True)
 class TopDecl(AST):
     pass
 
 # --------------------------------------------------------------------
-@dc.dataclass
+@dc.dataclass(slots = True)
 class GlobVarDecl(TopDecl):
     name: Name
     init: Expression
     type_: Type
 
 #--------------------------------------------------------------------
-@dc.dataclass
+@dc.dataclass(slots = True)
 class ProcDecl(TopDecl):
     name: Name
     arguments: list[tuple[Name, Type]]
@@ -0,0 +1,202 @@
+# --------------------------------------------------------------------
+import dataclasses as dc
+import enum
+import functools as ft
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+import typing as tp
+
+from . import bxtables
+
+from .bxast import InternedType
+
+# ====================================================================
+# Content-addressed cache for the artifacts (.s/.exe) of bxc.py
+#
+# An entry is a directory named after the hash of the source, of the
+# compiler (its sources and the runtime) and of the compilation flags,
+# and holds the artifacts of a successful compilation. The modification
+# time of an entry records its last use: the least recently used entries
+# are evicted first when the cache grows beyond its maximum size.
+#
+# The cache also holds pickled objects, one file per entry, such as the
+# lowered code of single procedures (see bxdriver).
+
+VERSION  = 2
+MAX_SIZE = 256 << 20
+
+EXTS = ('.s', '.exe')
+
+def default_dir() -> str:
+    return os.path.join(bxtables.cache_dir(), 'artifacts')
+
+# --------------------------------------------------------------------
+@ft.cache
+def compiler_signature() -> str:
+    root   = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(root)):
+        if os.path.splitext(name)[1] in ('.py', '.c'):
+            with open(os.path.join(root, name), 'rb') as stream:
+                digest.update(name.encode('utf-8') + b'\0')
+                digest.update(stream.read() + b'\0')
+    return digest.hexdigest()
+
+# --------------------------------------------------------------------
+@ft.cache
+def _fields(cls) -> tuple[str, ...]:
+    return tuple(x.name for x in dc.fields(cls) if x.name != 'position')
+
+def fingerprint(node) -> str:
+    """A structural representation of the AST `node`, ignoring the
+    source positions."""
+
+    aout = []
+
+    def walk(node):
+        match node:
+            case list() | tuple():
+                aout.append('[')
+                for x in node:
+                    walk(x)
+                aout.append(']')
+
+            case _ if dc.is_dataclass(node):
+                aout.append(f'{type(node).__name__}(')
+                for name in _fields(type(node)):
+                    walk(getattr(node, name))
+                aout.append(')')
+
+            case enum.Enum() | InternedType():
+                aout.append(f'{node!r},')
+
+            case _:
+                aout.append(f'{type(node).__name__}:{node!r},')
+
+    walk(node)
+    return ''.join(aout)
+
+# --------------------------------------------------------------------
+class BuildCache:
+    def __init__(self, root: tp.Optional[str] = None, max_size: int = MAX_SIZE):
+        self.root     = root or default_dir()
+        self.max_size = max_size
+
+    # ----------------------------------------------------------------
+    def key(self, source: str, *flags) -> str:
+        digest = hashlib.sha256()
+        for part in (VERSION, compiler_signature()) + flags:
+            digest.update(repr(part).encode('utf-8'))
+            digest.update(b'\0')
+        digest.update(source.encode('utf-8'))
+        return digest.hexdigest()
+
+    # ----------------------------------------------------------------
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:40])
+
+    # ----------------------------------------------------------------
+    def load(self, key: str):
+        """Return the object stored under `key`, or None on a miss."""
+
+        path = f'{self._path(key)}.pickle'
+
+        try:
+            with open(path, 'rb') as stream:
+                data = pickle.load(stream)
+            os.utime(path)
+        except (OSError, pickle.PickleError, EOFError, AttributeError, ValueError):
+            return None
+
+        return data
+
+    # ----------------------------------------------------------------
+    def save(self, key: str, data):
+        try:
+            os.makedirs(self.root, exist_ok = True)
+            fd, tmp = tempfile.mkstemp(dir = self.root, suffix = '.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as stream:
+                    pickle.dump(data, stream, protocol = pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, f'{self._path(key)}.pickle')
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except OSError:
+            pass
+
+    # ----------------------------------------------------------------
+    def fetch(self, key: str, basename: str, exts: tuple[str, ...] = EXTS) -> bool:
+        """Copy the artifacts `exts` of the entry `key` to {basename}{ext}.
+        Returns whether the entry exists."""
+
+        path = self._path(key)
+
+        try:
+            os.makedirs(os.path.dirname(basename) or '.', exist_ok = True)
+            for ext in exts:
+                shutil.copy(os.path.join(path, f'out{ext}'), f'{basename}{ext}')
+            os.utime(path)
+
+        except OSError:
+            return False
+
+        return True
+
+    # ----------------------------------------------------------------
+    def store(self, key: str, basename: str, exts: tuple[str, ...] = EXTS):
+        # The entry is populated under a temporary name and then renamed,
+        # so that concurrent compiler invocations never observe a partial
+        # entry.
+        try:
+            os.makedirs(self.root, exist_ok = True)
+            tmp = tempfile.mkdtemp(dir = self.root, suffix = '.tmp')
+            try:
+                for ext in exts:
+                    shutil.copy(f'{basename}{ext}', os.path.join(tmp, f'out{ext}'))
+                os.rename(tmp, self._path(key))
+            except BaseException:
+                shutil.rmtree(tmp, ignore_errors = True)
+                raise
+        except OSError:
+            pass
+
+    # ----------------------------------------------------------------
+    def evict(self):
+        """Evict the least recently used entries until the cache fits
+        in its maximum size."""
+
+        entries = []
+
+        try:
+            with os.scandir(self.root) as it:
+                for entry in it:
+                    if entry.name.endswith('.tmp'):
+                        continue
+                    try:
+                        if entry.is_dir():
+                            size = sum(x.stat().st_size for x in os.scandir(entry.path))
+                        else:
+                            size = entry.stat().st_size
+                        entries.append((entry.stat().st_mtime_ns, size, entry))
+                    except OSError:
+                        pass
+        except OSError:
+            return
+
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, entry in sorted(entries, key = lambda x: x[0]):
+            if total <= self.max_size:
+                break
+            try:
+                if entry.is_dir():
+                    shutil.rmtree(entry.path)
+                else:
+                    os.unlink(entry.path)
+            except OSError:
+                pass
+            total -= size
@@ -152,3 +152,38 @@ def uce(cfg: CFG) -> CFG:
     visit(cfg.init)
 
     return CFG(cfg.init, { x: cfg.cfg[x] for x in visited })
+
+# ====================================================================
+# Traversals
+
+def successors(node: CFGNode) -> list[str]:
+    aout = [args[1] for _, args in node.cjumps]
+    if node.jump[0] == 'jmp':
+        aout.append(node.jump[1])
+    return aout
+
+# --------------------------------------------------------------------
+def rpo(cfg: CFG) -> list[str]:
+    """The labels of the blocks of `cfg` in reverse post-order from its
+    entry, followed by the unreachable ones."""
+
+    order, visited = [], { cfg.init }
+    stack = [(cfg.init, iter(successors(cfg.cfg[cfg.init])))]
+
+    # Iterative depth-first search: CFGs can be far deeper than the
+    # recursion limit.
+    while stack:
+        name, succ = stack[-1]
+        for child in succ:
+            if child not in visited:
+                visited.add(child)
+                stack.append((child, iter(successors(cfg.cfg[child]))))
+                break
+        else:
+            order.append(name)
+            stack.pop()
+
+    order.reverse()
+    order.extend(x for x in cfg.cfg if x not in visited)
+
+    return order
@@ -0,0 +1,98 @@
+# --------------------------------------------------------------------
+import hashlib
+import json
+import os
+import socket
+import tempfile
+import typing as tp
+
+# ====================================================================
+# Client side of the compile server (see bxserver.py)
+#
+# This module is imported by bxc.py before it decides whether to compile
+# locally, and must therefore stay cheap to import: it must not depend
+# on PLY nor on the rest of the compiler.
+#
+# The protocol is line-based: the client sends one JSON object followed
+# by a newline and the server answers with one JSON object, followed by
+# a newline, before closing the connection.
+
+def socket_path() -> str:
+    if 'BXC_SOCKET' in os.environ:
+        return os.environ['BXC_SOCKET']
+    root = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(root, f'bxc-{os.getuid()}.sock')
+
+# --------------------------------------------------------------------
+def signature() -> str:
+    # A server that is running an older version of the compiler than the
+    # one on disk must not be used. Stat-ing the sources is much cheaper
+    # than reading them.
+    root   = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(root)):
+        if os.path.splitext(name)[1] in ('.py', '.c'):
+            st = os.stat(os.path.join(root, name))
+            digest.update(f'{name}:{st.st_size}:{st.st_mtime_ns}\0'.encode('utf-8'))
+    return digest.hexdigest()
+
+# --------------------------------------------------------------------
+def request(message: dict, path: tp.Optional[str] = None) -> tp.Optional[dict]:
+    """Send `message` to the server listening on `path` and return its
+    answer, or None if no server is reachable."""
+
+    path = path or socket_path()
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+            sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+            sock.shutdown(socket.SHUT_WR)
+
+            chunks = []
+            while chunk := sock.recv(1 << 16):
+                chunks.append(chunk)
+
+    except OSError:
+        return None
+
+    try:
+        return json.loads(b''.join(chunks))
+    except ValueError:
+        return None
+
+# --------------------------------------------------------------------
+def compile(
+        files     : list[tuple[str, str]],
+        parser    : str,
+        lexer     : str,
+        cache     : tp.Optional[tuple[tp.Optional[str], int]] = None,
+        save_temps: bool = False,
+        optlevel  : int = 1,
+        path      : tp.Optional[str] = None,
+) -> tp.Optional[list[tuple[bool, str]]]:
+    """Have the server compile the (source, output basename) pairs of
+    `files` to executables, using the build cache (directory, maximum
+    size) `cache` if given, keeping the assembly files if `save_temps`
+    is set, and at the optimisation level `optlevel`. Returns, for each
+    file, whether it compiled and its diagnostics, or None if the files
+    must be compiled locally."""
+
+    # The server does not share our working directory.
+    files = [(os.path.abspath(source), os.path.abspath(basename)) for source, basename in files]
+
+    answer = request(dict(
+        command   = 'compile',
+        signature = signature(),
+        files     = files,
+        parser    = parser,
+        lexer     = lexer,
+        cache     = cache,
+        savetemps = save_temps,
+        optlevel  = optlevel,
+    ), path)
+
+    if answer is None or not answer.get('ok'):
+        return None
+
+    return [(result['ok'], result['output']) for result in answer['results']]
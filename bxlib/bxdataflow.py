@@ -0,0 +1,475 @@
+# --------------------------------------------------------------------
+import abc
+import collections
+import heapq
+import typing as tp
+
+from .bxtac import *
+from .bxcfg import CFG, CFGNode, rpo, successors
+
+# ====================================================================
+# Dataflow analyses over a CFG
+#
+# An analysis gives a lattice (its `top` element and its `meet`), the
+# value that holds at the boundary of the CFG (on entry of the initial
+# block for a forward analysis, on exit of the returning blocks for a
+# backward one) and the transfer function of a block. The engine solves
+# it with a worklist that is ordered by reverse post-order (of the CFG
+# for a forward analysis, of the reversed CFG, i.e. post-order, for a
+# backward one), a block being visited again only when the output of a
+# block it depends on changed. The successors and predecessors of the
+# blocks are computed once, and the values on entry and exit of each
+# block are kept in `before` and `after`.
+#
+# The bit-vector analyses (see BitVector) represent sets as Python ints,
+# with their transfer functions summed up per block by gen/kill sets
+# that are computed once.
+
+def _temps(xs) -> list[str]:
+    return [x for x in xs if isinstance(x, str) and x.startswith('%')]
+
+def _uses(instr: TAC) -> list[str]:
+    return _temps(instr.arguments)
+
+def _defs(instr: TAC) -> list[str]:
+    return _temps([instr.result])
+
+def _terminators(node: CFGNode) -> list[TAC]:
+    aout = [TAC(opcode, args) for opcode, args in node.cjumps]
+    if node.jump[0] == 'ret':
+        aout.append(TAC('ret', node.jump[1]))
+    return aout
+
+def members(bits: int) -> tp.Iterator[int]:
+    """The indices of the bits of `bits` that are set."""
+
+    while bits:
+        low   = bits & -bits
+        bits ^= low
+        yield low.bit_length() - 1
+
+# --------------------------------------------------------------------
+class Dataflow(abc.ABC):
+    FORWARD = True
+
+    def __init__(self, cfg: CFG):
+        self.cfg    = cfg
+        self.order  = rpo(cfg)
+        self.succ   = { x: successors(cfg.cfg[x]) for x in self.order }
+        self.pred   = { x: [] for x in self.order }
+        self.before = {}                    # Block -> value on entry
+        self.after  = {}                    # Block -> value on exit
+        self.visits = 0                     # Number of transfers, for benchmarking
+
+        for name, succ in self.succ.items():
+            for child in succ:
+                self.pred[child].append(name)
+
+    # ----------------------------------------------------------------
+    # To be given by the analyses
+
+    @abc.abstractmethod
+    def top(self):
+        pass
+
+    @abc.abstractmethod
+    def boundary(self):
+        pass
+
+    @abc.abstractmethod
+    def meet(self, x, y):
+        pass
+
+    @abc.abstractmethod
+    def transfer(self, name: str, value):
+        pass
+
+    # ----------------------------------------------------------------
+    def instructions(self, name: str) -> list[TAC]:
+        """The instructions of the block `name`, its conditional jumps and
+        its final `ret` included."""
+
+        node = self.cfg.cfg[name]
+        return node.body + _terminators(node)
+
+    # ----------------------------------------------------------------
+    def solve(self):
+        # The blocks are here referred to by their index in the order of
+        # the visits.
+        names = self.order if self.FORWARD else self.order[::-1]
+        where = { x: i for i, x in enumerate(names) }
+        deps  = self.pred if self.FORWARD else self.succ
+        users = self.succ if self.FORWARD else self.pred
+
+        sources = [[where[y] for y in deps [x]] for x in names]
+        targets = [[where[y] for y in users[x]] for x in names]
+
+        if self.FORWARD:
+            bounds = [x == self.cfg.init for x in names]
+        else:
+            bounds = [not self.succ[x] for x in names]
+
+        top      = self.top()
+        boundary = self.boundary()
+        meet     = self.meet
+        transfer = self.transfer
+
+        inputs  = [top] * len(names)
+        outputs = [top] * len(names)
+
+        worklist = list(range(len(names)))
+        pending  = [True] * len(names)
+
+        while worklist:
+            i = heapq.heappop(worklist)
+            pending[i] = False
+
+            value = boundary if bounds[i] else None
+            for j in sources[i]:
+                value = outputs[j] if value is None else meet(value, outputs[j])
+
+            inputs[i]    = top if value is None else value
+            new          = transfer(names[i], inputs[i])
+            self.visits += 1
+
+            if new != outputs[i]:
+                outputs[i] = new
+                for j in targets[i]:
+                    if not pending[j]:
+                        pending[j] = True
+                        heapq.heappush(worklist, j)
+
+        if not self.FORWARD:
+            inputs, outputs = outputs, inputs
+
+        self.before = dict(zip(names, inputs))
+        self.after  = dict(zip(names, outputs))
+
+        return self
+
+# ====================================================================
+class BitVector(Dataflow):
+    UNION = True                            # May (union) or must (intersection)
+
+    def __init__(self, cfg: CFG):
+        super().__init__(cfg)
+        self.universe = 0                   # All the elements of the sets
+        self.gen      = {}                  # Block -> elements generated
+        self.kill     = {}                  # Block -> elements killed
+        self._keep    = {}
+
+    def top(self):
+        return 0 if self.UNION else self.universe
+
+    def boundary(self):
+        return 0
+
+    def meet(self, x, y):
+        return x | y if self.UNION else x & y
+
+    def transfer(self, name: str, value):
+        return self.gen[name] | (value & self._keep[name])
+
+    def solve(self):
+        self._keep = { x: ~y for x, y in self.kill.items() }
+        return super().solve()
+
+# ====================================================================
+# Liveness
+#
+# The temporaries get bit indices of their own, numbered densely for the
+# procedure being analysed (independently of their names, which come from
+# the counter of MM, reset at each procedure), and a set of temporaries is
+# an int whose bit i stands for the temporary `temps[i]`.
+
+class Liveness(BitVector):
+    FORWARD = False
+
+    def __init__(self, cfg: CFG):
+        super().__init__(cfg)
+
+        self.temps = []                     # Bit index -> temporary
+        self.index = {}                     # Temporary -> bit index
+
+        # Only the temporaries that are read before being written in some
+        # block can be live on the edges, and only them are numbered here:
+        # the size of an int being the one of its highest bit, numbering
+        # the many block-local temporaries too would make all the sets
+        # larger. The others get numbered on demand (see `live_after`).
+        exposed = {}
+
+        for name in self.order:
+            use, defs = [], set()
+            for instr in self.instructions(name):
+                use.extend(x for x in _uses(instr) if x not in defs)
+                defs.update(_defs(instr))
+            exposed[name] = (use, defs)
+
+        for use, _ in exposed.values():
+            self.bits(use)
+
+        for name, (use, defs) in exposed.items():
+            self.gen [name] = self.bits(use)
+            self.kill[name] = self.bits(x for x in defs if x in self.index)
+
+        self.universe = (1 << len(self.temps)) - 1
+        self.solve()
+
+    # ----------------------------------------------------------------
+    @property
+    def live_in(self) -> dict[str, int]:
+        return self.before
+
+    @property
+    def live_out(self) -> dict[str, int]:
+        return self.after
+
+    # ----------------------------------------------------------------
+    def bit(self, temp: str) -> int:
+        if (i := self.index.get(temp)) is None:
+            i = self.index[temp] = len(self.temps)
+            self.temps.append(temp)
+        return 1 << i
+
+    def bits(self, temps) -> int:
+        aout = 0
+        for temp in temps:
+            aout |= self.bit(temp)
+        return aout
+
+    def decode(self, bits: int) -> set[str]:
+        return { self.temps[i] for i in members(bits) }
+
+    # ----------------------------------------------------------------
+    def live_after(self, name: str) -> list[int]:
+        """The temporaries that are live after each of the instructions of
+        the block `name` (see `instructions`)."""
+
+        instrs = self.instructions(name)
+        aout   = [0] * len(instrs)
+        live   = self.live_out[name]
+
+        for i in range(len(instrs) - 1, -1, -1):
+            aout[i] = live
+            live   &= ~self.bits(_defs(instrs[i]))
+            live   |= self.bits(_uses(instrs[i]))
+
+        return aout
+
+# ====================================================================
+# Reaching definitions
+#
+# A definition is an instruction that writes a temporary, identified by
+# its block and its position in the block (see `instructions`), and bit
+# i of a set stands for the definition `defs[i]`. The arguments of the
+# procedure are not definitions.
+
+class ReachingDefinitions(BitVector):
+    def __init__(self, cfg: CFG):
+        super().__init__(cfg)
+
+        self.defs = []                      # Bit index -> (block, position, temporary)
+        bytemp    = {}                      # Temporary -> its definitions
+        byblock   = {}                      # Block -> its definitions, in order
+
+        for name in self.order:
+            byblock[name] = []
+            for i, instr in enumerate(self.instructions(name)):
+                for temp in _defs(instr):
+                    bit = 1 << len(self.defs)
+                    bytemp[temp] = bytemp.get(temp, 0) | bit
+                    byblock[name].append((bit, temp))
+                    self.defs.append((name, i, temp))
+
+        for name in self.order:
+            gen = kill = 0
+            for bit, temp in byblock[name]:
+                gen   = (gen & ~bytemp[temp]) | bit
+                kill |= bytemp[temp] & ~bit
+            self.gen [name] = gen
+            self.kill[name] = kill
+
+        self.universe = (1 << len(self.defs)) - 1
+        self.solve()
+
+    # ----------------------------------------------------------------
+    def decode(self, bits: int) -> list[tuple[str, int, str]]:
+        return [self.defs[i] for i in members(bits)]
+
+# ====================================================================
+# Available expressions
+#
+# An expression is an arithmetic instruction, up to its destination, i.e.
+# its opcode and its arguments. It is available at a point if it has been
+# computed on all the paths to that point, with none of its arguments
+# written since. Bit i of a set stands for the expression `exprs[i]`.
+
+PURE = frozenset(OPCODES.values())
+
+class AvailableExpressions(BitVector):
+    UNION = False
+
+    def __init__(self, cfg: CFG):
+        super().__init__(cfg)
+
+        self.exprs = []                     # Bit index -> (opcode, *arguments)
+        self.index = {}                     # Expression -> bit index
+        using      = {}                     # Temporary -> expressions that read it
+
+        for name in self.order:
+            for instr in self.instructions(name):
+                if instr.opcode in PURE:
+                    expr = (instr.opcode, *instr.arguments)
+                    if expr not in self.index:
+                        self.index[expr] = len(self.exprs)
+                        self.exprs.append(expr)
+                        for temp in _uses(instr):
+                            using[temp] = using.get(temp, 0) | (1 << self.index[expr])
+
+        for name in self.order:
+            gen = kill = 0
+            for instr in self.instructions(name):
+                if instr.opcode in PURE:
+                    gen |= 1 << self.index[(instr.opcode, *instr.arguments)]
+                for temp in _defs(instr):
+                    killed = using.get(temp, 0)
+                    gen   &= ~killed
+                    kill  |= killed
+            self.gen [name] = gen
+            self.kill[name] = kill
+
+        self.universe = (1 << len(self.exprs)) - 1
+        self.solve()
+
+    # ----------------------------------------------------------------
+    def decode(self, bits: int) -> list[tuple]:
+        return [self.exprs[i] for i in members(bits)]
+
+# ====================================================================
+# Constants
+#
+# The value of a block boundary maps temporaries to their constant value
+# (an int), or to NAC when they are not a constant. A temporary that is
+# not mapped has no known definition yet (the top of its lattice). The
+# operations are evaluated as the x64 backend does, on 64-bit integers,
+# and a division that would trap at run time is not folded.
+#
+# As for the liveness, only the temporaries that are read before being
+# written in some block are kept at the block boundaries: the others are
+# folded within their block and then forgotten, lest the boundaries of a
+# long procedure carry all the temporaries defined so far.
+
+NAC = None                              # Not a constant
+TOP = object()                          # No known definition yet (left unmapped)
+
+def _wrap(x: int) -> int:
+    x &= (1 << 64) - 1
+    return x - (1 << 64) if x >> 63 else x
+
+def _div(x: int, y: int) -> int | None:
+    if y == 0 or (x == -(1 << 63) and y == -1):
+        return None
+    q = abs(x) // abs(y)
+    return q if (x < 0) == (y < 0) else -q
+
+def evaluate(opcode: str, args: list[int]) -> int | None:
+    """The value of the arithmetic `opcode` on the constants `args`, or
+    None if it cannot be folded."""
+
+    match opcode, args:
+        case 'neg', [x]:    return _wrap(-x)
+        case 'not', [x]:    return _wrap(~x)
+        case 'add', [x, y]: return _wrap(x + y)
+        case 'sub', [x, y]: return _wrap(x - y)
+        case 'mul', [x, y]: return _wrap(x * y)
+        case 'and', [x, y]: return _wrap(x & y)
+        case 'or' , [x, y]: return _wrap(x | y)
+        case 'xor', [x, y]: return _wrap(x ^ y)
+        case 'shl', [x, y]: return _wrap(x << (y & 63))
+        case 'shr', [x, y]: return _wrap(x >> (y & 63))
+        case 'div', [x, y]:
+            return _div(x, y)
+        case 'mod', [x, y]:
+            q = _div(x, y)
+            return None if q is None else _wrap(x - q * y)
+    return None
+
+# --------------------------------------------------------------------
+class Constants(Dataflow):
+    def __init__(self, cfg: CFG, arguments: tp.Iterable[str] = ()):
+        super().__init__(cfg)
+
+        # The variables whose address is taken can be written through
+        # pointers: they are never constants.
+        self.escaping = {
+            instr.arguments[0]
+            for name in self.order for instr in self.instructions(name)
+            if instr.opcode == 'ref'
+        }
+        self.arguments = list(arguments)
+
+        self.exposed = set()
+        for name in self.order:
+            defs = set()
+            for instr in self.instructions(name):
+                self.exposed.update(x for x in _uses(instr) if x not in defs)
+                defs.update(_defs(instr))
+
+        self.solve()
+
+    def top(self):
+        return {}
+
+    def boundary(self):
+        return { x: NAC for x in [*self.arguments, *self.escaping] }
+
+    def meet(self, x, y):
+        aout = dict(x)
+        for temp, value in y.items():
+            if temp not in aout:
+                aout[temp] = value
+            elif aout[temp] != value:
+                aout[temp] = NAC
+        return aout
+
+    def transfer(self, name: str, value):
+        aout  = dict(value)
+        local = {}
+        env   = collections.ChainMap(local, aout)
+
+        for instr in self.instructions(name):
+            for temp in _defs(instr):
+                folded = NAC if temp in self.escaping else self.fold(instr, env)
+                target = aout if temp in self.exposed else local
+                if folded is TOP:
+                    target.pop(temp, None)
+                else:
+                    target[temp] = folded
+        return aout
+
+    # ----------------------------------------------------------------
+    @staticmethod
+    def fold(instr: TAC, env: tp.Mapping[str, int | None]) -> int | None:
+        """The constant value written by `instr` under the constants `env`,
+        NAC, or TOP if it reads a temporary that `env` does not map yet."""
+
+        def value(x):
+            if not isinstance(x, str):
+                return int(x)
+            if not x.startswith('%'):
+                return NAC                  # A global
+            return env.get(x, TOP)
+
+        match instr.opcode:
+            case 'const':
+                return int(instr.arguments[0])
+            case 'copy':
+                return value(instr.arguments[0])
+            case opcode if opcode in PURE:
+                args = [value(x) for x in instr.arguments]
+                if any(x is NAC for x in args):
+                    return NAC
+                if any(x is TOP for x in args):
+                    return TOP
+                return evaluate(opcode, args)
+        return NAC
@@ -0,0 +1,491 @@
+# --------------------------------------------------------------------
+import concurrent.futures as cf
+import contextlib as cl
+import functools as ft
+import hashlib
+import io
+import multiprocessing as mp
+import os
+import signal
+import subprocess as sp
+import sys
+import tempfile
+import typing as tp
+
+from .bxast        import *
+from .bxerrors     import Reporter, DefaultReporter
+from .bxparser     import Parser
+from .bxpratt      import PrattParser
+from .bxmm         import MM
+from .bxtychecker  import check as tycheck, PreTyper, DeclChecker
+from .bxasmgen     import AsmGen
+from .bxtac        import *
+from .bxcfg        import tac2cfg, cfg2tac, uce, jthreading
+from .bxbuildcache import BuildCache, EXTS, fingerprint
+from .bxtiming     import phase
+from .             import bxtiming
+from .             import bxtables
+
+# ====================================================================
+# Compilation pipeline, shared by bxc.py and the compile server
+
+BXRUNTIME = os.path.join(os.path.dirname(__file__), 'bxruntime.c')
+GCCFLAGS  = ('-g',)
+
+# Register allocator of each optimisation level (see bxregalloc). At
+# level 0, all the temporaries live on the stack.
+OPTLEVELS = {
+    0: None,
+    1: 'linear',
+    2: 'irc',
+}
+
+_parsers: dict[tuple[str, str], Parser] = {}  # Warm parsers of the current process
+
+def get_parser(parser: str, lexer: str) -> Parser:
+    if (parser, lexer) not in _parsers:
+        _parsers[parser, lexer] = Parser.get_backend(parser)(
+            reporter       = DefaultReporter(source = ''),
+            lexer          = lexer,
+            lazy_positions = True,
+        )
+    return _parsers[parser, lexer]
+
+_lowering: tp.Optional[tuple[int, cf.ProcessPoolExecutor]] = None  # Pool for lower_procs
+
+def _lowering_pool(jobs: int) -> cf.ProcessPoolExecutor:
+    global _lowering
+
+    if _lowering is None or _lowering[0] != jobs:
+        if _lowering is not None:
+            _lowering[1].shutdown()
+        _lowering = (jobs, cf.ProcessPoolExecutor(max_workers = jobs))
+    return _lowering[1]
+
+# --------------------------------------------------------------------
+class CompileError(Exception):
+    """Raised by an assembly stream (see compile_stream) when one of the
+    declarations does not type-check. The diagnostics have already been
+    printed."""
+
+# --------------------------------------------------------------------
+def _gcc(*args: str) -> bool:
+    result = sp.run(['gcc', *args], stdout = sp.PIPE, stderr = sp.STDOUT, text = True)
+    print(result.stdout, end = '', file = sys.stderr)
+    return result.returncode == 0
+
+# --------------------------------------------------------------------
+@ft.cache
+def runtime() -> str:
+    """The BX runtime to link against: an object file compiled once,
+    and cached until bxruntime.c changes, or the C source itself if it
+    cannot be cached."""
+
+    with open(BXRUNTIME, 'rb') as stream:
+        key = hashlib.sha256(repr(GCCFLAGS).encode('utf-8') + stream.read()).hexdigest()
+
+    path = os.path.join(bxtables.cache_dir(), f'bxruntime-{key[:32]}.o')
+
+    if os.path.exists(path):
+        return path
+
+    # The object is compiled under a temporary name and then renamed, so
+    # that concurrent compiler invocations never link a partial object.
+    try:
+        os.makedirs(bxtables.cache_dir(), exist_ok = True)
+        fd, tmp = tempfile.mkstemp(dir = bxtables.cache_dir(), suffix = '.o')
+        os.close(fd)
+    except OSError:
+        return BXRUNTIME
+
+    result = sp.run(
+        ['gcc', *GCCFLAGS, '-c', '-o', tmp, BXRUNTIME],
+        stdout = sp.DEVNULL, stderr = sp.DEVNULL,
+    )
+
+    try:
+        if result.returncode == 0:
+            os.replace(tmp, path)
+            return path
+        os.unlink(tmp)
+    except OSError:
+        pass
+
+    return BXRUNTIME
+
+# --------------------------------------------------------------------
+def lower_proc(
+        proc    : ProcDecl,
+        cache   : tp.Optional[BuildCache] = None,
+        optlevel: int = 1,
+) -> tuple[TACProc, list[str]]:
+    """Lower the type-checked procedure `proc` down to its optimised TAC
+    and to x64 assembly lines, at the optimisation level `optlevel`. If
+    `cache` is given, a procedure that has already been lowered is not
+    lowered again."""
+
+    # The type annotations of the AST record the signatures of the
+    # callees and the types of the globals that the procedure uses.
+    name = proc.name.value
+
+    if cache is not None:
+        with phase('cache', name):
+            key  = cache.key(fingerprint(proc), 'proc', optlevel)
+            aout = cache.load(key)
+        if aout is not None:
+            return aout
+
+    with phase('mm', name):
+        tac = MM.mm_proc(proc)
+
+    # We here do TAC -> CFG -> JTHREADING -> UCE -> TAC
+    # Other CFG-based optimizations should be inserted here
+    with phase('cfg', name):
+        tac.tac = cfg2tac(uce(jthreading(tac2cfg(tac.tac))))
+
+    abk   = AsmGen.get_backend('x64-linux')
+    alloc = None
+
+    if OPTLEVELS[optlevel] is not None:
+        with phase('regalloc', name):
+            alloc = abk.allocate(tac, OPTLEVELS[optlevel])
+
+    with phase('asmgen', name):
+        aout = (tac, abk.lower1(tac, alloc))
+
+    if cache is not None:
+        cache.save(key, aout)
+
+    return aout
+
+# --------------------------------------------------------------------
+def _lower_job(job: tuple[ProcDecl, tp.Optional[BuildCache], int]) -> list[str]:
+    return lower_proc(*job)[1]
+
+def _lowering_jobs(jobs: int) -> int:
+    # The workers of a batch build or of the compile server, that are
+    # already running in parallel, do not spawn pools of their own.
+    if mp.parent_process() is not None:
+        return 1
+
+    # The timings of the procedures are only recorded in this process.
+    if bxtiming.enabled():
+        return 1
+
+    return jobs
+
+def lower_procs(
+        procs   : list[ProcDecl],
+        cache   : tp.Optional[BuildCache] = None,
+        jobs    : int = 1,
+        optlevel: int = 1,
+) -> tp.Iterator[list[str]]:
+    """Lower the procedures `procs` (see lower_proc) and yield their
+    assembly lines, in order. With `jobs` > 1, the procedures are
+    lowered by a pool of as many processes. Otherwise, they are lowered
+    one by one, as they are consumed."""
+
+    jobs = min(_lowering_jobs(jobs), len(procs))
+
+    # Labels and temporaries being numbered per procedure, the output
+    # does not depend on how the procedures are spread over the workers.
+    if jobs <= 1:
+        return (_lower_job((proc, cache, optlevel)) for proc in procs)
+
+    pool = _lowering_pool(jobs)
+    return iter(pool.map(
+        _lower_job, [(proc, cache, optlevel) for proc in procs],
+        chunksize = max(1, len(procs) // (4 * jobs)),
+    ))
+
+# --------------------------------------------------------------------
+def compile_stream(
+        prgm      : str,
+        parser    : str,
+        lexer     : str,
+        cache     : tp.Optional[BuildCache] = None,
+        lower_jobs: int = 1,
+        optlevel  : int = 1,
+) -> tp.Optional[tp.Iterator[str]]:
+    """Compile the BX source `prgm` down to x64 assembly, that is
+    yielded in chunks (one per declaration) as the declarations get
+    lowered. Diagnostics are printed on stderr. If `cache` is given,
+    only the procedures that changed are lowered. The procedures are
+    lowered by `lower_jobs` processes, at the optimisation level
+    `optlevel` (see OPTLEVELS).
+
+    Unless the procedures are lowered in parallel, the declarations are
+    type-checked one at a time, after pretyping: each one is checked,
+    lowered and emitted, and then released, before the next one. None
+    is returned on the errors found up to pretyping, before any chunk
+    is produced. A later error raises a CompileError from the stream.
+    Otherwise, the whole program is type-checked first. Either way, the
+    chunks come in the order of the declarations in the source."""
+
+    reporter = DefaultReporter(source = prgm)
+    bparser  = get_parser(parser, lexer)
+    bparser.reset(reporter)
+
+    with phase('parse'):
+        prgm = bparser.parse(prgm)
+
+    if prgm is None:
+        return None
+
+    if _lowering_jobs(lower_jobs) <= 1:
+        with phase('pretype'):
+            with reporter.checkpoint() as checkpoint:
+                scope, procs = PreTyper(reporter).pretype(prgm)
+        if not checkpoint:
+            return None
+        return _stream(prgm, DeclChecker(scope, procs, reporter), reporter, cache, optlevel)
+
+    with phase('tycheck'):
+        if not tycheck(prgm, reporter = reporter):
+            return None
+
+    with phase('globals'):
+        abk = AsmGen.get_backend('x64-linux')
+        asm = [abk.lower1(decl) for decl in MM.mm_globals(prgm)]
+
+    # The lowering is started here, rather than when the first procedure
+    # is consumed: the processes of a lowering pool must be forked before
+    # the caller spawns the assembler, lest they inherit its input pipe
+    # (that would then never be closed).
+    procs = lower_procs(
+        [decl for decl in prgm if isinstance(decl, ProcDecl)],
+        cache, lower_jobs, optlevel,
+    )
+
+    return _chunks(prgm, iter(asm), procs)
+
+def _chunks(
+        prgm   : Program,
+        globals: tp.Iterator[list[str]],
+        procs  : tp.Iterator[list[str]],
+) -> tp.Iterator[str]:
+    # Same output as `_stream`: one chunk per declaration, in source order.
+    for decl in prgm:
+        lines = next(globals) if isinstance(decl, GlobVarDecl) else next(procs)
+        if lines:
+            yield "\n".join(lines) + "\n"
+
+def _stream(
+        prgm    : Program,
+        checker : DeclChecker,
+        reporter: Reporter,
+        cache   : tp.Optional[BuildCache],
+        optlevel: int,
+) -> tp.Iterator[str]:
+    abk = AsmGen.get_backend('x64-linux')
+    ok  = True
+
+    # The declarations are popped from the program as they are processed,
+    # the program being the only other reference to them.
+    prgm.reverse()
+
+    while prgm:
+        decl = prgm.pop()
+        name = decl.name.value
+
+        with reporter.checkpoint() as checkpoint:
+            with phase('tycheck', name):
+                checker(decl)
+
+        # Once an error has been found, the remaining declarations are
+        # only checked, for their diagnostics.
+        ok = ok and bool(checkpoint)
+
+        if not ok:
+            continue
+
+        match decl:
+            case GlobVarDecl():
+                with phase('globals', name):
+                    lines = abk.lower1(MM.mm_globals([decl])[0])
+
+            case ProcDecl():
+                lines = lower_proc(decl, cache, optlevel)[1]
+
+        if lines:
+            yield "\n".join(lines) + "\n"
+
+    if not ok:
+        raise CompileError()
+
+# --------------------------------------------------------------------
+def compile_source(
+        prgm      : str,
+        parser    : str,
+        lexer     : str,
+        cache     : tp.Optional[BuildCache] = None,
+        lower_jobs: int = 1,
+        optlevel  : int = 1,
+) -> tp.Optional[str]:
+    """Compile the BX source `prgm` down to x64 assembly, returned as a
+    whole, or None on error. See compile_stream."""
+
+    asm = compile_stream(prgm, parser, lexer, cache, lower_jobs, optlevel)
+
+    if asm is None:
+        return None
+
+    try:
+        return "".join(asm)
+    except CompileError:
+        return None
+
+# --------------------------------------------------------------------
+def build(asm: tp.Iterable[str], basename: str, save_temps: bool = False) -> bool:
+    """Assemble the chunks of assembly `asm` and link them against the
+    BX runtime into {basename}.exe, with a single gcc invocation. The
+    chunks are piped into gcc as they are produced, unless `save_temps`
+    is set, in which case they are first written to {basename}.s."""
+
+    with phase('runtime'):
+        bxruntime = runtime()
+
+    try:
+        os.makedirs(os.path.dirname(basename) or '.', exist_ok = True)
+
+        if save_temps:
+            try:
+                with open(f'{basename}.s', 'w') as stream:
+                    stream.writelines(asm)
+            except CompileError:
+                os.unlink(f'{basename}.s')
+                raise
+
+    except IOError as e:
+        print(f'cannot write output file {basename}.s: {e}', file = sys.stderr)
+        return False
+
+    if save_temps:
+        with phase('gcc'):
+            return _gcc(*GCCFLAGS, '-o', f'{basename}.exe', f'{basename}.s', bxruntime)
+
+    # The diagnostics of gcc go to a file rather than to a pipe: we do
+    # not read them until all the assembly has been written, and gcc
+    # could otherwise block on a full pipe while we block on its input.
+    with tempfile.TemporaryFile('w+') as output:
+        proc = sp.Popen(
+            ['gcc', *GCCFLAGS, '-o', f'{basename}.exe', bxruntime, '-x', 'assembler', '-'],
+            stdin = sp.PIPE, stdout = output, stderr = sp.STDOUT, text = True,
+            start_new_session = True,
+        )
+
+        try:
+            for chunk in asm:
+                proc.stdin.write(chunk)
+
+        except BrokenPipeError:
+            pass                # gcc exited early, and reports why below
+
+        except BaseException:
+            # gcc, and the assembler it runs, are stopped before their
+            # input is closed, so that they never link a partial listing.
+            # SIGTERM (rather than SIGKILL) lets gcc remove its temporary
+            # files.
+            with cl.suppress(ProcessLookupError):
+                os.killpg(proc.pid, signal.SIGTERM)
+            proc.wait()
+            raise
+
+        finally:
+            with cl.suppress(BrokenPipeError):
+                proc.stdin.close()
+
+        with phase('gcc'):
+            proc.wait()
+
+        output.seek(0)
+        print(output.read(), end = '', file = sys.stderr)
+
+    return proc.returncode == 0
+
+# --------------------------------------------------------------------
+def compile_file(
+        source    : str,
+        basename  : tp.Optional[str],
+        parser    : str = 'lalr',
+        lexer     : str = 'ply',
+        cache     : tp.Optional[BuildCache] = None,
+        lower_jobs: int = 1,
+        save_temps: bool = False,
+        optlevel  : int = 1,
+) -> tuple[bool, tp.Optional[str]]:
+    """Compile the file `source`. When `basename` is not None, the
+    executable {basename}.exe is produced, along with the assembly file
+    {basename}.s if `save_temps` is set. Otherwise, the assembly is
+    generated but not linked. Returns whether the compilation succeeded,
+    and the generated assembly when `basename` is None.
+
+    If `cache` is given, the artifacts of a source that has already
+    been compiled are reused, and the ones of a successful compilation
+    are stored. See compile_stream for `lower_jobs` and `optlevel`."""
+
+    try:
+        with open(source, 'r') as stream:
+            prgm = stream.read()
+
+    except IOError as e:
+        print(f'cannot read input file {source}: {e}', file = sys.stderr)
+        return False, None
+
+    if basename is None:
+        asm = compile_source(prgm, parser, lexer, cache, lower_jobs, optlevel)
+        return asm is not None, asm
+
+    exts = EXTS if save_temps else ('.exe',)
+
+    if cache is not None:
+        with phase('cache'):
+            key = cache.key(prgm, GCCFLAGS, exts, optlevel)
+            hit = cache.fetch(key, basename, exts)
+        if hit:
+            return True, None
+
+    asm = compile_stream(prgm, parser, lexer, cache, lower_jobs, optlevel)
+
+    if asm is None:
+        return False, None
+
+    try:
+        ok = build(asm, basename, save_temps)
+    except CompileError:
+        return False, None
+
+    if cache is not None:
+        if ok:
+            cache.store(key, basename, exts)
+        cache.evict()
+
+    return ok, None
+
+# --------------------------------------------------------------------
+def warm(parser: str, lexer: str):
+    get_parser(parser, lexer)
+
+# --------------------------------------------------------------------
+def compile_job(job: tuple, timed: bool = False) \
+        -> tuple[bool, str, tp.Optional[str], tp.Optional[list[dict]]]:
+    """Run `compile_file(*job)`, returning its outcome along with all
+    the diagnostics it printed. If `timed` is set, the passes are timed
+    (see bxtiming): their report is appended to the diagnostics and the
+    recorded events are returned."""
+
+    # All the diagnostics of a file are collected, so that the ones of
+    # files compiled in parallel are not interleaved.
+    output = io.StringIO()
+    events = None
+
+    with cl.redirect_stdout(output), cl.redirect_stderr(output):
+        if timed:
+            with bxtiming.timing(job[0]) as timer:
+                ok, asm = compile_file(*job)
+            print(timer.report(), end = '')
+            events = timer.events
+        else:
+            ok, asm = compile_file(*job)
+
+    return ok, output.getvalue(), asm, events
@@ -6,7 +6,7 @@ import sys
 
 from typing import Optional as Opt
 
-from bxast import *
+from .bxast import *
 
 # ====================================================================
 class _ReporterContextManager:
@@ -22,8 +22,11 @@ class Reporter(abc.ABC):
     def __init__(self, source: str):
         self.source  = source.splitlines()
         self.nerrors = 0
+        self.locator = None     # resolves compact positions (Lexer.range_of)
 
-    def __call__(self, message: str, position: Opt[Range] = None):
+    def __call__(self, message: str, position: Opt[Range | int] = None):
+        if isinstance(position, int):
+            position = self.locator.range_of(position)
         self.nerrors += 1
         self._report(message, position)
 
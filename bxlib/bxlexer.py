@@ -1,10 +1,13 @@
 # --------------------------------------------------------------------
 import bisect
+import functools as ft
 import ply.lex
 import re
 
-from bxast    import Range
-from bxerrors import Reporter
+from .bxast    import Range
+from .bxerrors import Reporter
+
+from . import bxtables
 
 # ====================================================================
 # BX lexer definition
@@ -116,19 +119,106 @@ class Lexer:
     t_ignore = ' \t'            # Ignore all whitespaces
     t_ignore_comment = '//.*'
 
+    _prototype = None           # PLY lexer shared by all the instances
+
     def __init__(self, reporter: Reporter):
-        self.lexer    = ply.lex.lex(module = self)
+        self.lexer    = self._build()
         self.reporter = reporter
         self.bol      = [0]
 
+    def reset(self, reporter: Reporter):
+        self.reporter     = reporter
+        self.bol          = [0]
+        self.lexer.lineno = 1
+
+    @classmethod
+    def signature(cls) -> str:
+        rules = sorted(
+            (k, v.__code__.co_firstlineno, v.__doc__) if callable(v) else (k, 0, v)
+            for k, v in vars(cls).items() if k.startswith('t_')
+        )
+        return bxtables.signature(cls.tokens, cls.keywords, rules)
+
+    def _build(self):
+        # Reflection, validation & master regex compilation are only
+        # done once per process (and once per grammar when the table
+        # cache is warm). Instances then get a clone of the prototype
+        # that is bound to their own t_* methods.
+        if Lexer._prototype is None:
+            Lexer._prototype = self._load() or self._reflect()
+
+        # clone() rebinds the rules tables but not the active ones
+        lexer = Lexer._prototype.clone(self)
+        lexer.begin(lexer.lexstate)
+        return lexer
+
+    def _reflect(self):
+        lexer = ply.lex.lex(module = self)
+
+        bxtables.store('lexer', self.signature(), dict(
+            tokens  = sorted(lexer.lextokens),
+            reflags = lexer.lexreflags,
+            ignore  = lexer.lexstateignore,
+            errorf  = {k: f.__name__ for k, f in lexer.lexstateerrorf.items() if f},
+            states  = {
+                state: [
+                    (cre.pattern, [
+                        None if e is None else (e[0] and e[0].__name__, e[1])
+                        for e in findex
+                    ]) for cre, findex in relist
+                ] for state, relist in lexer.lexstatere.items()
+            },
+            retext  = lexer.lexstateretext,
+        ))
+
+        return lexer
+
+    def _load(self):
+        tables = bxtables.load('lexer', self.signature())
+
+        if tables is None:
+            return None
+
+        lexer = ply.lex.Lexer()
+
+        for state, relist in tables['states'].items():
+            lexer.lexstatere[state] = [
+                (re.compile(pattern, tables['reflags']), [
+                    None if e is None else (e[0] and getattr(self, e[0]), e[1])
+                    for e in findex
+                ]) for pattern, findex in relist
+            ]
+
+        lexer.lextokens      = set(tables['tokens'])
+        lexer.lextokens_all  = set(lexer.lextokens)
+        lexer.lexreflags     = tables['reflags']
+        lexer.lexstateinfo   = { state: 'inclusive' for state in lexer.lexstatere }
+        lexer.lexstateretext = tables['retext']
+        lexer.lexstateignore = tables['ignore']
+        lexer.lexstateerrorf = { k: getattr(self, f) for k, f in tables['errorf'].items() }
+        lexer.begin('INITIAL')
+
+        return lexer
+
     def column_of_pos(self, pos: int) -> int:
         assert(0 <= pos)
         return pos - self.bol[bisect.bisect_right(self.bol, pos)-1]
 
+    def line_of_pos(self, pos: int) -> int:
+        assert(0 <= pos)
+        return bisect.bisect_right(self.bol, pos)
+
+    def range_of(self, span: int) -> Range:
+        start, end = span >> 32, span & 0xffffffff
+        return Range(
+            start = (self.line_of_pos(start), self.column_of_pos(start)    ),
+            end   = (self.line_of_pos(end  ), self.column_of_pos(end  ) + 1),
+        )
+
     def t_newline(self, t):
         r'\n+'
         t.lexer.lineno += len(t.value)
-        self.bol.append(t.lexer.lexpos)
+        self.bol.extend(range(t.lexpos + 1, t.lexer.lexpos + 1))
 
     def t_IDENT(self, t):
         r'[a-zA-Z_][a-zA-Z0-9_]*'
@@ -148,3 +238,127 @@ class Lexer:
             position = position,
         )
         t.lexer.skip(1)
+
+    @classmethod
+    def get_backend(cls, name):
+        return cls.BACKENDS[name]
+
+# ====================================================================
+# Single-pass BX lexer (no PLY)
+
+class Token:
+    __slots__ = ('type', 'value', 'lineno', 'lexpos', 'lexer')
+
+    def __init__(self, type_: str, value, lineno: int, lexpos: int):
+        self.type   = type_
+        self.value  = value
+        self.lineno = lineno
+        self.lexpos = lexpos
+
+    def __repr__(self):
+        return f'LexToken({self.type},{self.value!r},{self.lineno},{self.lexpos})'
+
+# --------------------------------------------------------------------
+class ScanLexer(Lexer):
+    _master = None
+    _puncts = None
+
+    def __init__(self, reporter: Reporter):
+        self.lexer    = self
+        self.reporter = reporter
+        self.bol      = [0]
+        self.lineno   = 1
+        self.lexpos   = 0
+        self.token    = lambda: None
+
+    @classmethod
+    def _master_re(cls):
+        # Same alternatives and same order as the master regex assembled
+        # by ply.lex: function rules by line number, then string rules by
+        # decreasing length, and a last catch-all for illegal characters.
+        # Rules that are plain escaped literals (punctuation) are merged
+        # into a single longest-first group, and ignored characters are
+        # consumed as part of the following match.
+        if ScanLexer._master is None:
+            funcs, strs, puncts = [], [], {}
+
+            for name in sorted(dir(Lexer)):
+                if not name.startswith('t_') or name in ('t_ignore', 't_error'):
+                    continue
+                rule = getattr(Lexer, name)
+                if callable(rule):
+                    funcs.append((rule.__code__.co_firstlineno, name[2:], rule.__doc__))
+                elif re.escape(literal := re.sub(r'\\(.)', r'\1', rule)) == rule:
+                    puncts[literal] = name[2:]
+                else:
+                    strs.append((name[2:], rule))
+
+            funcs.sort()
+            strs.sort(key = lambda x: len(x[1]), reverse = True)
+
+            ScanLexer._puncts = puncts
+            ScanLexer._master = re.compile(
+                f'[{re.escape(Lexer.t_ignore)}]*(?:' + '|'.join(
+                    [f'(?P<{name}>{regex})' for _, name, regex in funcs] +
+                    [f'(?P<{name}>{regex})' for name, regex in strs] +
+                    ['(?P<punct>' + '|'.join(
+                        re.escape(x) for x in sorted(puncts, key = len, reverse = True)
+                    ) + ')'] +
+                    ['(?P<error>.)', r'(?P<eof>\Z)']
+                ) + ')', re.VERBOSE
+            )
+
+        return ScanLexer._master
+
+    def input(self, data: str):
+        self.token = ft.partial(next, self._scan(data), None)
+
+    def _scan(self, data: str):
+        master   = self._master_re()
+        keywords = self.keywords
+        puncts   = self._puncts
+        bol      = self.bol
+        lineno   = self.lineno
+
+        for m in master.finditer(data):
+            kind = m.lastgroup
+
+            if kind == 'IDENT':
+                value = m.group(kind)
+                self.lexpos = m.end()
+                yield Token(keywords.get(value, kind), value, lineno, m.start(kind))
+
+            elif kind == 'NUMBER':
+                self.lexpos = m.end()
+                yield Token(kind, int(m.group(kind)), lineno, m.start(kind))
+
+            elif kind == 'newline':
+                lineno = self.lineno = lineno + m.end() - m.start(kind)
+                bol.extend(range(m.start(kind) + 1, m.end() + 1))
+
+            elif kind == 'error':
+                position = Range.of_position(lineno, self.column_of_pos(m.start(kind)))
+                self.reporter(
+                    f"illegal character: `{m.group(kind)}' -- skipping",
+                    position = position,
+                )
+
+            elif kind == 'eof':
+                break
+
+            elif kind == 'punct':
+                value = m.group(kind)
+                self.lexpos = m.end()
+                yield Token(puncts[value], value, lineno, m.start(kind))
+
+            elif kind != 'ignore_comment':
+                self.lexpos = m.end()
+                yield Token(kind, m.group(kind), lineno, m.start(kind))
+
+        self.lexpos = len(data) + 1
+
+# --------------------------------------------------------------------
+Lexer.BACKENDS = {
+    'ply'  : Lexer,
+    'scan' : ScanLexer,
+}
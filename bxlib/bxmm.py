@@ -4,14 +4,21 @@ import contextlib as cl
 from typing import Optional as Opt
 
 from .bxast   import *
-from .bxscope import Scope
 from .bxtac   import *
 
 # ====================================================================
 # Maximal munch
 
+#
+# Temporaries and labels are numbered per procedure, and labels are
+# qualified by the name of their procedure, so that the code generated
+# for a procedure does not depend on the other ones. The later passes
+# on a procedure (see bxcfg) keep drawing from its counter, and must
+# therefore be run before the next procedure is lowered.
+
 class MM:
     _counter = -1
+    _prefix  = ''
 
     PRINTS = {
         Type.INT  : 'print_int',
@@ -21,7 +28,7 @@ class MM:
     def __init__(self):
         self._proc    = None
         self._tac     = []
-        self._scope   = Scope()
+        self._locals  = []
         self._loops   = []
 
     tac = property(lambda self: self._tac)
@@ -31,6 +38,16 @@ class MM:
         mm = MM(); mm.for_program(prgm)
         return mm._tac
 
+    @staticmethod
+    def mm_globals(prgm: Program) -> list[TACVar]:
+        mm = MM(); mm.for_globals(prgm)
+        return mm._tac
+
+    @staticmethod
+    def mm_proc(proc: ProcDecl) -> TACProc:
+        mm = MM(); mm.for_procdecl(proc)
+        return mm._tac[0]
+
     @classmethod
     def fresh_temporary(cls):
         cls._counter += 1
@@ -39,7 +56,7 @@ class MM:
     @classmethod
     def fresh_label(cls):
         cls._counter += 1
-        return f'.L{cls._counter}'
+        return f'.L_{cls._prefix}_{cls._counter}'
 
     def push(
             self,
@@ -52,6 +69,15 @@ class MM:
     def push_label(self, label: str):
         self._proc.tac.append(f'{label}:')
 
+    def for_binding(self, binding: Binding) -> str:
+        match binding.storage:
+            case Storage.GLOBAL:
+                return f'@{binding.index}'
+            case Storage.PARAM:
+                return self._proc.arguments[binding.index]
+            case Storage.LOCAL:
+                return self._locals[binding.index]
+
     @cl.contextmanager
     def in_loop(self, labels: tuple[str, str]):
         self._loops.append(labels)
@@ -61,58 +87,64 @@ class MM:
             self._loops.pop()
 
     def for_program(self, prgm: Program):
+        self.for_globals(prgm)
+
+        for decl in prgm:
+            if isinstance(decl, ProcDecl):
+                self.for_procdecl(decl)
+
+    def for_globals(self, prgm: Program):
         for decl in prgm:
             match decl:
                 case GlobVarDecl(name, init, type_):
                     assert(isinstance(init, IntExpression))
                     self._tac.append(TACVar(name.value, init.value))
-                    self._scope.push(name.value, f'@{name.value}')
-
-        for decl in prgm:
-            match decl:
-                case ProcDecl(name, arguments, retty, body):
-                    assert(self._proc is None)
-                    with self._scope.in_subscope():
-                        self._proc = TACProc(
-                            name      = name.value,
-                            arguments = [f'%{x[0].value}' for x in arguments],
-                        )
 
-                        for argument in arguments:
-                            self._scope.push(argument[0].value, f'%{argument[0].value}')
+    def for_procdecl(self, proc: ProcDecl):
+        match proc:
+            case ProcDecl(name, arguments, retty, body):
+                assert(self._proc is None)
+                MM._counter = -1
+                MM._prefix  = name.value
+                self._proc = TACProc(
+                    name      = name.value,
+                    arguments = [f'%{x[0].value}' for x in arguments],
+                )
+                self._locals = []
 
-                        self.for_statement(body)
+                self.for_statement(body)
 
-                        if name.value == 'main':
-                            self.for_statement(ReturnStatement(IntExpression(0)));
+                if name.value == 'main':
+                    self.for_statement(ReturnStatement(IntExpression(0)));
 
-                        self._tac.append(self._proc)
-                        self._proc = None
+                self._tac.append(self._proc)
+                self._proc = None
 
     def for_block(self, block: Block):
-        with self._scope.in_subscope():
-            for stmt in block:
-                self.for_statement(stmt)
+        for stmt in block:
+            self.for_statement(stmt)
 
     def for_statement(self, stmt: Statement):
         match stmt:
             case VarDeclStatement(name, init, type_):
-                self._scope.push(name.value, self.fresh_temporary())
+                assert(stmt.binding.index == len(self._locals))
+                self._locals.append(self.fresh_temporary())
                 temp = self.for_expression(init)
-                self.push('copy', temp, result = self._scope[name.value])
+                self.push('copy', temp, result = self.for_binding(stmt.binding))
                 
                 # Handle array type
                 if isinstance(type_, Array):
+                    self._proc.var_sizes[self.for_binding(stmt.binding)] = type_.sizeof()
                     array_address = self.fresh_temporary()
-                    self.push("ref", self._scope[name.value], result=array_address)
+                    self.push("ref", self.for_binding(stmt.binding), result=array_address)
                     array_size = type_.sizeof() * type_.element_type.sizeof()
                     self.push("zero_out", array_address, array_size)
                 else:
-                    self.push('copy', temp, result=self._scope[name.value])
+                    self.push('copy', temp, result=self.for_binding(stmt.binding))
 
             case AssignStatement(lhs, rhs):
                 temp = self.for_expression(rhs)
-                self.push('copy', temp, result = self._scope[lhs.value])
+                self.push('copy', temp, result = self.for_binding(stmt.binding))
 
             case ExprStatement(expr):
                 self.for_expression(expr)
@@ -184,7 +216,7 @@ class MM:
         else:
             match expr:
                 case VarExpression(name):
-                    target = self._scope[name.value]
+                    target = self.for_binding(expr.binding)
 
                 case IntExpression(value):
                     target = self.fresh_temporary()
@@ -228,12 +260,12 @@ class MM:
                         case VarExpression(name):
                             # For a variable, get its address directly
                             target = self.fresh_temporary()
-                            var_reg = self._scope[name.value]
+                            var_reg = self.for_binding(value.binding)
                             self.push("ref", var_reg, result=target)
 
                         case Array(array, index):
                             # For an array element, calculate the address of the element
-                            array_address = self._scope[array.value]
+                            array_address = self.for_binding(array.binding)
                             index_temp = self.for_expression(index)
                             element_size = array.element_type.sizeof()
                             offset_temp = self.fresh_temporary()
@@ -268,7 +300,7 @@ class MM:
 
         match expr:
             case VarExpression(name):
-                temp = self._scope[name.value]
+                temp = self.for_binding(expr.binding)
                 self.push('jz', temp, flabel)
                 self.push('jmp', tlabel)
 
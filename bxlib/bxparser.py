@@ -9,9 +9,36 @@ import sys
 
 ########################
 
-from bxast    import *
-from bxerrors import Reporter, DefaultReporter
-from bxlexer  import Lexer
+from .bxast    import *
+from .bxerrors import Reporter, DefaultReporter
+from .bxlexer  import Lexer
+
+from . import bxtables
+
+# ====================================================================
+# Cached LALR tables
+
+class _Production:
+    def __init__(self, name: str, len_: int, func: str | None, str_: str):
+        self.name     = name
+        self.len      = len_
+        self.func     = func
+        self.str      = str_
+        self.callable = None
+
+    def bind(self, pdict):
+        if self.func:
+            self.callable = pdict[self.func]
+
+class _LRTable:
+    def __init__(self, tables: dict):
+        self.lr_productions = [_Production(*p) for p in tables['productions']]
+        self.lr_action      = tables['action']
+        self.lr_goto        = tables['goto']
+
+    def bind_callables(self, pdict):
+        for p in self.lr_productions:
+            p.bind(pdict)
 
 # ====================================================================
 # BX parser definition
@@ -61,6 +88,7 @@ class Parser:
         ('left'    , 'STAR', 'SLASH', 'PCENT'  ),
         ('right'   , 'BANG', 'UMINUS'          ),
         ('right'   , 'UNEG'                    ),
+        ('right'   , 'DEREF'                   ),
 
     # NEW PRECEDENCE 
        # ('right'   , 'BITCOMPL'                          ),
@@ -68,10 +96,56 @@ class Parser:
        # ('left'    , 'STAR', 'LBRACKET', 'RBRACKET'      ), 
     )
 
-    def __init__(self, reporter: Reporter):
-        self.lexer    = Lexer(reporter = reporter)
-        self.parser   = ply.yacc.yacc(module = self)
+    def __init__(self, reporter: Reporter, lexer: str = 'ply', lazy_positions: bool = False):
+        self.lexer    = Lexer.get_backend(lexer)(reporter = reporter)
+        self.parser   = self._build()
         self.reporter = reporter
+        self.lazy     = lazy_positions
+
+        if lazy_positions:
+            self._position   = self._span
+            reporter.locator = self.lexer
+
+    def reset(self, reporter: Reporter):
+        # Makes the parser (and its lexer) ready for a new input, whose
+        # errors are sent to `reporter`.
+        self.reporter = reporter
+        self.lexer.reset(reporter)
+        if self.lazy:
+            reporter.locator = self.lexer
+
+    @classmethod
+    def signature(cls) -> str:
+        # Productions are numbered by PLY in the order of the p_*
+        # functions, so the line numbers are part of the grammar too.
+        rules = sorted(
+            (f.__code__.co_firstlineno, name, f.__doc__)
+            for name, f in vars(cls).items()
+            if name.startswith('p_') and name != 'p_error' and callable(f)
+        )
+        return bxtables.signature(cls.start, cls.precedence, cls.tokens, rules)
+
+    def _build(self):
+        key    = self.signature()
+        tables = bxtables.load('parser', key)
+
+        if tables is not None:
+            lrtable = _LRTable(tables)
+            lrtable.bind_callables({
+                p.func: getattr(self, p.func)
+                for p in lrtable.lr_productions if p.func
+            })
+            return ply.yacc.LRParser(lrtable, self.p_error)
+
+        parser = ply.yacc.yacc(module = self)
+
+        bxtables.store('parser', key, dict(
+            productions = [(p.name, p.len, p.func, p.str) for p in parser.productions],
+            action      = parser.action,
+            goto        = parser.goto,
+        ))
+
+        return parser
 
     def parse(self, program: str):
         with self.reporter.checkpoint() as checkpoint:
@@ -83,6 +157,10 @@ class Parser:
 
             return ast if checkpoint else None
 
+    @classmethod
+    def get_backend(cls, name):
+        return cls.BACKENDS[name]
+
     def _position(self, p) -> Range:
         n = len(p) - 1
         return Range(
@@ -90,6 +168,9 @@ class Parser:
             end   = (p.linespan(n)[1], self.lexer.column_of_pos(p.lexspan(n)[1]) + 1),
         )
 
+    def _span(self, p) -> int:
+        return span(p.lexspan(1)[0], p.lexspan(len(p) - 1)[1])
+
     def p_name(self, p):
         """name : IDENT"""
         p[0] = Name(
@@ -456,6 +537,7 @@ class Parser:
         else:
             self.reporter('syntax error at end of file')
 
-
-
-
+# --------------------------------------------------------------------
+Parser.BACKENDS = {
+    'lalr' : Parser,
+}
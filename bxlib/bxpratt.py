@@ -0,0 +1,544 @@
+# --------------------------------------------------------------------
+import re
+
+import ply.yacc
+
+from .bxast    import *
+from .bxerrors import Reporter
+from .bxlexer  import Lexer
+from .bxparser import Parser
+
+# ====================================================================
+# Hand-written BX parser (recursive descent + precedence climbing)
+#
+# Accepts the same language as the LALR tables of `Parser` -- including
+# the way PLY resolves the conflicts of the grammar -- builds the same
+# AST (positions included) and reports the syntax errors on the same
+# tokens, mimicking PLY's `stmts : stmts error SEMICOLON` recovery.
+
+class _SyntaxError(Exception):
+    pass
+
+class _Abort(Exception):
+    pass
+
+_EOF = ('$end', None, None, None)
+
+# --------------------------------------------------------------------
+def _prefixes(grammar: type) -> dict[str, str]:
+    # The precedence of the prefix rules (`X : TOKEN expr`) of the grammar:
+    # the one given by their `%prec`, or, as in PLY, the one of TOKEN.
+    aout = {}
+
+    for name in dir(grammar):
+        rule = getattr(grammar, name)
+        if not name.startswith('p_') or not rule.__doc__ or ':' not in rule.__doc__:
+            continue
+        for alternative in rule.__doc__.split(':', 1)[1].split('|'):
+            match alternative.split():
+                case [token, 'expr', '%prec', prec] if token.isupper():
+                    aout[token] = prec
+                case [token, 'expr'] if token.isupper():
+                    aout[token] = token
+
+    return aout
+
+# --------------------------------------------------------------------
+class PrattParser(Parser):
+    # Precedence of the prefix operators, read from the rules of `Parser`
+    PREFIX = _prefixes(Parser)
+
+    # After `&`, an identifier followed by one of these tokens is reduced
+    # by PLY to `assignable : IDENT` instead of `name : IDENT`.
+    REF_FOLLOW = frozenset(('COLON', 'RPAREN', 'COMMA', 'RBRACKET', 'SEMICOLON'))
+
+    def __init__(self, reporter: Reporter, lexer: str = 'ply', lazy_positions: bool = False):
+        self.lexer    = Lexer.get_backend(lexer)(reporter = reporter)
+        self.reporter = reporter
+        self.lazy     = lazy_positions
+
+        if lazy_positions:
+            self._fetch      = self._fetch_offset
+            self._range      = self._span
+            reporter.locator = self.lexer
+
+        self.levels = {}
+        for level, (assoc, *kinds) in enumerate(self.precedence, 1):
+            for kind in kinds:
+                self.levels[kind] = (level, assoc)
+
+        self.infix = {
+            kind: (self.BINOP[op],) + self.levels[kind]
+            for kind in self.levels if isinstance(getattr(Lexer, f't_{kind}', None), str)
+            for op in self.BINOP if re.fullmatch(getattr(Lexer, f't_{kind}'), op)
+        }
+
+    def parse(self, program: str):
+        with self.reporter.checkpoint() as checkpoint:
+            self.lexer.lexer.input(program)
+
+            self._token      = self.lexer.lexer.token
+            self._bol        = self.lexer.bol
+            self._errorcount = 0
+            self._ahead      = None
+            self._last       = None
+            self._cur        = self._fetch()
+
+            try:
+                ast = self._program()
+            except _Abort:
+                ast = None
+
+            return ast if checkpoint else None
+
+    # ----------------------------------------------------------------
+    # Tokens are kept as (type, value, position, token) tuples, where
+    # the position is a (line, column) pair, or the source offset of the
+    # token when positions are lazy.
+
+    def _fetch(self):
+        tok = self._token()
+        if tok is None:
+            return _EOF
+        # All the newlines before `tok` have been seen by the lexer, and
+        # none of the ones after it.
+        return (tok.type, tok.value, (tok.lineno, tok.lexpos - self._bol[-1]), tok)
+
+    def _fetch_offset(self):
+        tok = self._token()
+        if tok is None:
+            return _EOF
+        return (tok.type, tok.value, tok.lexpos, tok)
+
+    def _peek(self):
+        if self._ahead is None:
+            self._ahead = self._fetch()
+        return self._ahead
+
+    def _skip(self):
+        if self._ahead is None:
+            self._cur = self._fetch()
+        else:
+            self._cur, self._ahead = self._ahead, None
+
+    def _advance(self):
+        tok = self._cur
+        self._last = tok[2]
+        if self._errorcount:
+            self._errorcount -= 1
+        if self._ahead is None:
+            self._cur = self._fetch()
+        else:
+            self._cur, self._ahead = self._ahead, None
+        return tok
+
+    def _expect(self, kind: str):
+        if self._cur[0] != kind:
+            self._error()
+        return self._advance()
+
+    def _error(self):
+        kind, _, _, tok = self._cur
+
+        if self._errorcount == 0:
+            if kind == '$end':
+                self.reporter('syntax error at end of file')
+            else:
+                position = Range.of_position(
+                    tok.lineno,
+                    self.lexer.column_of_pos(tok.lexpos),
+                )
+                self.reporter(f'syntax error', position = position)
+        self._errorcount = ply.yacc.error_count
+
+        if kind == '$end':
+            raise _Abort()
+        raise _SyntaxError()
+
+    def _range(self, start: tuple[int, int]) -> Range:
+        return Range(start = start, end = (self._last[0], self._last[1] + 1))
+
+    def _span(self, start: int) -> int:
+        return span(start, self._last)
+
+    # ----------------------------------------------------------------
+    def _name(self):
+        _, value, position, _ = self._expect('IDENT')
+        return Name(value = value, position = self._range(position))
+
+    def _type(self):
+        match self._cur[0]:
+            case 'BOOL':
+                self._advance()
+                return Type.BOOL
+
+            case 'INT':
+                self._advance()
+                return Type.INT
+
+            case 'STAR':
+                return Pointer(element_type = self._advance()[1])
+
+            case 'LBRACKET':
+                # Same node as `Parser.p_type_array`
+                lbracket = self._advance()[1]
+                self._expect('NUMBER')
+                rbracket = self._expect('RBRACKET')[1]
+                return Array(element_type = lbracket, size = rbracket)
+
+        self._error()
+
+    # ----------------------------------------------------------------
+    def _expr(self, rlevel: int = 0, rassoc: str | None = None, index: bool = True):
+        # Parses an expression, stopping at the first token on which PLY
+        # would reduce a pending rule of precedence (rassoc, rlevel).
+        # `[` has no precedence: it only extends expressions that are not
+        # the operand of an operator.
+        start = self._cur[2]
+        left  = self._prefix()
+        infix = self.infix
+
+        while True:
+            kind = self._cur[0]
+
+            if kind in infix:
+                operator, level, assoc = infix[kind]
+                if level < rlevel:
+                    break
+                if level == rlevel:
+                    if rassoc == 'left':
+                        break
+                    if rassoc == 'nonassoc':
+                        self._error()
+                self._advance()
+                right = self._expr(level, assoc)
+                left  = OpAppExpression(
+                    operator  = operator,
+                    arguments = [left, right],
+                    position  = self._range(start),
+                )
+
+            elif kind == 'LBRACKET' and rlevel == 0 and index:
+                left = self._access(left, start)
+
+            else:
+                break
+
+        return left
+
+    def _access(self, array, start):
+        self._expect('LBRACKET')
+        index = self._expr()
+        self._expect('RBRACKET')
+        return AccessExpression(
+            array_expr = array,
+            index      = index,
+            position   = self._range(start),
+        )
+
+    def _prefix(self):
+        kind, value, position, _ = self._cur
+
+        match kind:
+            case 'IDENT':
+                name = self._name()
+                if self._cur[0] == 'LPAREN':
+                    self._advance()
+                    arguments = self._exprs_comma()
+                    self._expect('RPAREN')
+                    return CallExpression(
+                        proc      = name,
+                        arguments = arguments,
+                        position  = self._range(position),
+                    )
+                return VarExpression(name = name, position = self._range(position))
+
+            case 'NUMBER':
+                self._advance()
+                return IntExpression(value = value, position = self._range(position))
+
+            case 'TRUE' | 'FALSE':
+                self._advance()
+                return BoolExpression(value = (value == 'true'), position = self._range(position))
+
+            case 'LPAREN':
+                self._advance()
+                expr = self._expr()
+                self._expect('RPAREN')
+                return expr
+
+            case 'DASH' | 'TILD' | 'BANG':
+                self._advance()
+                argument = self._expr(*self.levels[self.PREFIX[kind]])
+                return OpAppExpression(
+                    operator  = self.UNIOP[value],
+                    arguments = [argument],
+                    position  = self._range(position),
+                )
+
+            case 'STAR':
+                self._advance()
+                self._expr(*self.levels[self.PREFIX[kind]])
+                # Same node as `Parser.p_assignable`
+                return DereferenceExpression(
+                    pointer_expr = value,
+                    position     = self._range(position),
+                )
+
+            case 'AMP':
+                return self._reference()
+
+            case 'PRINT':
+                self._advance()
+                self._expect('LPAREN')
+                argument = self._expr()
+                self._expect('RPAREN')
+                return PrintExpression(argument = argument, position = self._range(position))
+
+            case 'NULL':
+                self._advance()
+                return NullExpression(value = None, position = self._range(position))
+
+            case 'ALLOC':
+                self._advance()
+                type_ = self._type()
+                self._expect('LBRACKET')
+                if self._cur[0] == 'NUMBER' and self._peek()[0] == 'RBRACKET':
+                    size = IntExpression(value = self._advance()[1])
+                else:
+                    size = self._expr()
+                self._expect('RBRACKET')
+                return AllocateExpression(
+                    size       = size,
+                    alloc_type = type_,
+                    position   = self._range(position),
+                )
+
+        self._error()
+
+    def _reference(self):
+        position = self._advance()[2]
+
+        match self._cur[0]:
+            case 'IDENT' if self._peek()[0] in self.REF_FOLLOW:
+                _, name, vposition, _ = self._advance()
+                value = VarExpression(name = name, position = self._range(vposition))
+
+            case 'STAR':
+                value = self._prefix()
+
+            case _:
+                start = self._cur[2]
+                value = self._access(self._expr(index = False), start)
+
+        return ReferenceExpression(value = value, position = self._range(position))
+
+    def _exprs_comma(self):
+        exprs = []
+        if self._cur[0] != 'RPAREN':
+            exprs.append(self._expr())
+            while self._cur[0] == 'COMMA':
+                self._advance()
+                exprs.append(self._expr())
+        return exprs
+
+    # ----------------------------------------------------------------
+    def _stmt(self):
+        kind, _, position, _ = self._cur
+
+        match kind:
+            case 'IDENT' if self._peek()[0] == 'EQ':
+                lhs = self._name()
+                self._advance()
+                rhs = self._expr()
+                self._expect('SEMICOLON')
+                return AssignStatement(lhs = lhs, rhs = rhs, position = self._range(position))
+
+            case 'VAR':
+                self._advance()
+                name = self._name()
+                self._expect('EQ')
+                init = self._expr()
+                self._expect('COLON')
+                type_ = self._type()
+                self._expect('SEMICOLON')
+                return VarDeclStatement(
+                    name     = name,
+                    init     = init,
+                    type_    = type_,
+                    position = self._range(position),
+                )
+
+            case 'IF':
+                self._advance()
+                self._expect('LPAREN')
+                condition = self._expr()
+                self._expect('RPAREN')
+                then  = self._block()
+                else_ = self._elif()
+                return IfStatement(
+                    condition = condition,
+                    then      = then,
+                    else_     = else_,
+                    position  = self._range(position),
+                )
+
+            case 'WHILE':
+                self._advance()
+                self._expect('LPAREN')
+                condition = self._expr()
+                self._expect('RPAREN')
+                body = self._block()
+                return WhileStatement(
+                    condition = condition,
+                    body      = body,
+                    position  = self._range(position),
+                )
+
+            case 'BREAK':
+                self._advance()
+                self._expect('SEMICOLON')
+                return BreakStatement(position = self._range(position))
+
+            case 'CONTINUE':
+                self._advance()
+                self._expect('SEMICOLON')
+                return ContinueStatement(position = self._range(position))
+
+            case 'RETURN':
+                self._advance()
+                expr = None if self._cur[0] == 'SEMICOLON' else self._expr()
+                self._expect('SEMICOLON')
+                return ReturnStatement(expr = expr, position = self._range(position))
+
+            case 'LBRACE':
+                return self._block()
+
+        expression = self._expr()
+        self._expect('SEMICOLON')
+        return ExprStatement(expression = expression, position = self._range(position))
+
+    def _elif(self):
+        if self._cur[0] != 'ELSE':
+            # PLY gives to the empty `stmt_elif` the position of the lexer
+            # once the lookahead token has been read.
+            lexer = self.lexer.lexer
+            if self.lazy:
+                self._last = lexer.lexpos
+            else:
+                self._last = (lexer.lineno, self.lexer.column_of_pos(lexer.lexpos))
+            return None
+
+        position = self._advance()[2]
+        if self._cur[0] != 'IF':
+            return self._block()
+
+        self._advance()
+        self._expect('LPAREN')
+        condition = self._expr()
+        self._expect('RPAREN')
+        then  = self._block()
+        else_ = self._elif()
+        return IfStatement(
+            condition = condition,
+            then      = then,
+            else_     = else_,
+            position  = self._range(position),
+        )
+
+    def _block(self):
+        position = self._expect('LBRACE')[2]
+        stmts    = []
+
+        while self._cur[0] != 'RBRACE':
+            try:
+                stmts.append(self._stmt())
+            except _SyntaxError:
+                self._recover()
+
+        self._advance()
+        return BlockStatement(body = stmts, position = self._range(position))
+
+    def _recover(self):
+        # `stmts : stmts error SEMICOLON`: shift `error`, then discard all
+        # the tokens up to the next semicolon.
+        if self._errorcount:
+            self._errorcount -= 1
+        while self._cur[0] != 'SEMICOLON':
+            if self._cur[0] == '$end':
+                raise _Abort()
+            self._skip()
+            self._errorcount = ply.yacc.error_count
+        self._advance()
+
+    # ----------------------------------------------------------------
+    def _procdecl(self):
+        position = self._advance()[2]
+        name     = self._name()
+        self._expect('LPAREN')
+
+        arguments = []
+        if self._cur[0] != 'RPAREN':
+            arguments.append(self._arg())
+            while self._cur[0] == 'COMMA':
+                self._advance()
+                arguments.append(self._arg())
+        self._expect('RPAREN')
+
+        rettype = None
+        if self._cur[0] == 'COLON':
+            self._advance()
+            rettype = self._type()
+
+        body = self._block()
+
+        return ProcDecl(
+            name      = name,
+            arguments = arguments,
+            rettype   = rettype,
+            body      = body,
+            position  = self._range(position),
+        )
+
+    def _arg(self):
+        name = self._name()
+        self._expect('COLON')
+        return (name, self._type())
+
+    def _globvardecl(self):
+        position = self._advance()[2]
+        name     = self._name()
+        self._expect('EQ')
+        init = self._expr()
+        self._expect('COLON')
+        type_ = self._type()
+        self._expect('SEMICOLON')
+        return GlobVarDecl(
+            name     = name,
+            init     = init,
+            type_    = type_,
+            position = self._range(position),
+        )
+
+    def _program(self):
+        prgm = []
+
+        while self._cur[0] != '$end':
+            try:
+                match self._cur[0]:
+                    case 'DEF':
+                        prgm.append(self._procdecl())
+                    case 'VAR':
+                        prgm.append(self._globvardecl())
+                    case _:
+                        self._error()
+            except _SyntaxError:
+                # Outside of any block, PLY unwinds its whole stack, drops
+                # the offending token and starts the program over.
+                self._skip()
+                prgm = []
+
+        return prgm
+
+# --------------------------------------------------------------------
+Parser.BACKENDS['pratt'] = PrattParser
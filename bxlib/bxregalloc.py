@@ -0,0 +1,650 @@
+# --------------------------------------------------------------------
+import dataclasses as dc
+import typing as tp
+
+from .bxtac      import *
+from .bxcfg      import tac2cfg
+from .bxdataflow import Liveness
+
+# ====================================================================
+# Register allocation
+#
+# The allocators work on the (optimised) TAC of a procedure and map its
+# temporaries either to a register of the backend, or to the stack (the
+# temporaries that are left unmapped). From the backend, they only need
+# the allocatable registers, split between the caller-saved and the
+# callee-saved ones, and the registers that each TAC instruction
+# clobbers: a temporary that is live across an instruction cannot be
+# held in a register that this instruction clobbers.
+
+JUMPS  = ('jmp',)
+CJUMPS = ('jz', 'jnz', 'jlt', 'jle', 'jgt', 'jge')
+
+def is_temp(x) -> bool:
+    return isinstance(x, str) and x.startswith('%')
+
+# --------------------------------------------------------------------
+@dc.dataclass
+class Registers:
+    caller_saved: list[str]
+    callee_saved: list[str]
+    clobbers    : tp.Callable[[TAC], frozenset[str]]
+
+    @property
+    def all(self) -> list[str]:
+        # Caller-saved registers come first: they are cheaper, as they do
+        # not have to be saved by the procedure.
+        return self.caller_saved + self.callee_saved
+
+# --------------------------------------------------------------------
+@dc.dataclass
+class Allocation:
+    registers: dict[str, str]   # Temporary -> register
+    spilled  : set[str]         # Temporaries spilled under register pressure
+    slots    : dict[str, int] = dc.field(default_factory = dict)
+                                # Temporary -> stack slot, for the others
+
+    def used(self) -> set[str]:
+        return set(self.registers.values())
+
+# ====================================================================
+# Liveness, per instruction of the linear TAC of a procedure
+#
+# The live sets at the boundaries of the blocks are the ones of the CFG
+# of the TAC (see bxdataflow.Liveness), and are propagated backwards
+# through the instructions of each block. Labels are kept as (empty)
+# instructions, so that positions are plain indices in the TAC. The
+# arguments of `param` are read by the `call` that follows, and are thus
+# considered as used by the `call`.
+
+class LiveSets:
+    def __init__(self, tac: list[str | TAC]):
+        self.tac      = tac
+        self.uses     = []              # Temporaries read by each instruction
+        self.defs     = []              # Temporaries written by each instruction
+        self.block    = []              # Block of each instruction
+        self.live_in  = []              # Live temporaries before each instruction
+        self.live_out = []              # Live temporaries after each instruction
+
+        if not tac:
+            self.flow = None
+            return
+
+        self.flow = Liveness(tac2cfg(tac))
+
+        # The blocks are cut as by tac2cfg, that lists them in order.
+        names  = iter(self.flow.cfg.cfg)
+        name   = None
+        params = []
+
+        for i, instr in enumerate(tac):
+            if name is None or isinstance(instr, str) or _ends_block(tac[i-1]):
+                name = next(names)
+
+            uses, defs = [], []
+
+            if isinstance(instr, TAC):
+                match instr.opcode:
+                    case 'param':
+                        params.extend(filter(is_temp, instr.arguments[1:]))
+                    case 'call':
+                        uses, params = params, []
+                    case _:
+                        uses = list(filter(is_temp, instr.arguments))
+
+                if is_temp(instr.result):
+                    defs = [instr.result]
+
+            self.uses .append(set(uses))
+            self.defs .append(set(defs))
+            self.block.append(name)
+
+        self.live_in  = [None] * len(tac)
+        self.live_out = [None] * len(tac)
+
+        live = set()
+        for i in range(len(tac) - 1, -1, -1):
+            if i == len(tac) - 1 or self.block[i+1] != self.block[i]:
+                live = self.flow.decode(self.flow.live_out[self.block[i]])
+            self.live_out[i] = live
+            self.live_in [i] = live = (live - self.defs[i]) | self.uses[i]
+
+def _ends_block(instr: str | TAC) -> bool:
+    return isinstance(instr, TAC) and (instr.opcode == 'ret' or instr.opcode in JUMPS + CJUMPS)
+
+# ====================================================================
+# Live intervals: the smallest range of positions that covers all the
+# positions where a temporary is live or written.
+
+@dc.dataclass
+class Interval:
+    temp     : str
+    start    : int
+    end      : int
+    forbidden: set[str] = dc.field(default_factory = set)
+
+def intervals(
+        proc   : TACProc,
+        live   : LiveSets,
+        regs   : Registers,
+        exclude: tp.Container[str] = (),
+) -> list[Interval]:
+    aout = {}
+
+    # The arguments are all written on entry.
+    for temp in proc.arguments:
+        if is_temp(temp) and temp not in exclude:
+            aout[temp] = Interval(temp, 0, 0)
+
+    for i, instr in enumerate(live.tac):
+        seen = live.live_in[i] | live.defs[i]
+
+        # The intervals are created in a deterministic order (that of sets
+        # of strings is not), for the output not to vary between runs.
+        for temp in sorted(x for x in seen if x not in aout and x not in exclude):
+            aout[temp] = Interval(temp, i, i)
+
+        for temp in seen:
+            if temp in aout:
+                aout[temp].end = i
+
+    for temp, clobbers in forbidden(live, regs).items():
+        if temp in aout:
+            aout[temp].forbidden |= clobbers
+
+    return list(aout.values())
+
+# --------------------------------------------------------------------
+def forbidden(live: LiveSets, regs: Registers) -> dict[str, set[str]]:
+    """The registers that each temporary cannot be held in, as it is live
+    across an instruction that clobbers them."""
+
+    aout = {}
+
+    for i, instr in enumerate(live.tac):
+        if isinstance(instr, TAC) and (clobbers := regs.clobbers(instr)):
+            for temp in live.live_out[i] - live.defs[i]:
+                aout.setdefault(temp, set()).update(clobbers)
+
+    return aout
+
+# ====================================================================
+# Linear scan (Poletto & Sarkar)
+#
+# The intervals are visited by increasing start. An interval gets any
+# free register that it is allowed to use, or, when there is none, the
+# register of the active interval that ends last, which is spilled
+# (unless the interval itself ends later, in which case it is the one
+# that is spilled). A spilled temporary lives on the stack for its
+# whole lifetime.
+
+def linear_scan(ivals: list[Interval], regs: Registers) -> Allocation:
+    registers = {}
+    spilled   = set()
+    active    = []
+
+    for ival in sorted(ivals, key = lambda x: x.start):
+        active = [x for x in active if x.end >= ival.start]
+        inuse  = { registers[x.temp] for x in active }
+        free   = [r for r in regs.all if r not in inuse and r not in ival.forbidden]
+
+        if free:
+            registers[ival.temp] = free[0]
+            active.append(ival)
+            continue
+
+        victims = [x for x in active if registers[x.temp] not in ival.forbidden]
+        victim  = max(victims, key = lambda x: x.end, default = None)
+
+        if victim is not None and victim.end > ival.end:
+            registers[ival.temp] = registers.pop(victim.temp)
+            spilled.add(victim.temp)
+            active.remove(victim)
+            active.append(ival)
+        else:
+            spilled.add(ival.temp)
+
+    return Allocation(registers, spilled)
+
+# ====================================================================
+# Loop depths and spill costs
+#
+# The loops are the natural loops of the back edges, i.e. of the edges
+# to a block that is on the stack of a depth-first search from the entry
+# (the flow graph of a BX procedure being reducible). The loop depth of
+# an instruction is the number of loop headers whose loop contains its
+# block. The spill cost of a temporary is the number of its reads and
+# writes, each weighted by 10^(loop depth).
+
+def loop_depths(live: LiveSets) -> list[int]:
+    if live.flow is None:
+        return []
+
+    succ  = live.flow.succ
+    pred  = live.flow.pred
+    loops = {}                          # Header -> sources of its back edges
+
+    init  = live.flow.cfg.init
+    state = dict.fromkeys(succ, 0)      # 0: unvisited, 1: on the stack, 2: done
+    stack = [(init, iter(succ[init]))]
+    state[init] = 1
+
+    while stack:
+        name, children = stack[-1]
+        for child in children:
+            if state[child] == 1:
+                loops.setdefault(child, []).append(name)
+            elif state[child] == 0:
+                state[child] = 1
+                stack.append((child, iter(succ[child])))
+                break
+        else:
+            state[name] = 2
+            stack.pop()
+
+    depths = dict.fromkeys(succ, 0)
+
+    for header, sources in loops.items():
+        body     = { header }
+        worklist = [x for x in sources if x not in body]
+        body.update(worklist)
+
+        while worklist:
+            for parent in pred[worklist.pop()]:
+                if parent not in body:
+                    body.add(parent)
+                    worklist.append(parent)
+
+        for name in body:
+            depths[name] += 1
+
+    return [depths[x] for x in live.block]
+
+def spill_costs(live: LiveSets) -> dict[str, float]:
+    aout = {}
+
+    for i, depth in enumerate(loop_depths(live)):
+        for temp in live.uses[i] | live.defs[i]:
+            aout[temp] = aout.get(temp, 0) + 10 ** depth
+    return aout
+
+# ====================================================================
+# Interference graph
+#
+# A temporary written by an instruction interferes with the temporaries
+# that are live after it, except that the destination of a `copy` does
+# not interfere with its source: the two may share a register, in which
+# case the copy goes away. Such copies are recorded as the moves of the
+# graph, i.e. as candidates for coalescing.
+
+@dc.dataclass
+class Graph:
+    nodes    : list[str]                # In a deterministic order
+    adj      : dict[str, set[str]]
+    forbidden: dict[str, set[str]]
+    moves    : list[tuple[str, str]]    # (source, destination) of copies
+    costs    : dict[str, float]
+
+def interference(
+        proc   : TACProc,
+        live   : LiveSets,
+        regs   : Registers,
+        exclude: tp.Container[str] = (),
+) -> Graph:
+    nodes = {}
+    adj   = {}
+    moves = []
+
+    def node(temp):
+        if temp not in nodes:
+            nodes[temp] = None
+            adj[temp]   = set()
+
+    def edge(x, y):
+        if x != y and x not in exclude and y not in exclude:
+            adj[x].add(y); adj[y].add(x)
+
+    # The arguments are all written on entry.
+    args = [x for x in proc.arguments if is_temp(x) and x not in exclude]
+
+    for temp in args:
+        node(temp)
+    for temp in args:
+        for other in args + (sorted(live.live_in[0]) if live.tac else []):
+            if other not in exclude:
+                node(other)
+                edge(temp, other)
+
+    for i, instr in enumerate(live.tac):
+        for temp in sorted(live.uses[i] | live.defs[i]):
+            if temp not in exclude:
+                node(temp)
+
+        if not live.defs[i]:
+            continue
+
+        ignore = set()
+        if isinstance(instr, TAC) and instr.opcode == 'copy' and is_temp(instr.arguments[0]):
+            ignore.add(instr.arguments[0])
+            if instr.arguments[0] not in exclude and instr.result not in exclude:
+                moves.append((instr.arguments[0], instr.result))
+
+        for temp in live.defs[i]:
+            if temp in exclude:
+                continue
+            for other in sorted(live.live_out[i] - ignore):
+                if other not in exclude:
+                    node(other)
+                    edge(temp, other)
+
+    clobbers = forbidden(live, regs)
+    costs    = spill_costs(live)
+
+    return Graph(
+        nodes     = list(nodes),
+        adj       = adj,
+        forbidden = { x: set(clobbers.get(x, ())) for x in nodes },
+        moves     = moves,
+        costs     = { x: costs.get(x, 0) for x in nodes },
+    )
+
+# ====================================================================
+# Iterated register coalescing (George & Appel)
+#
+# Chaitin-Briggs colouring of the interference graph, interleaved with
+# conservative (Briggs) coalescing of the moves. A node whose forbidden
+# registers are F can only take K - |F| colours: this is its number of
+# colours in all the degree tests. Spilling is optimistic: a node of
+# high degree is removed from the graph (the cheapest one, in spill
+# cost per degree) and only spilled if no colour is left for it when it
+# is put back. The backend accesses the spilled temporaries in memory,
+# so that no spill code has to be inserted and no second round is run.
+
+class IRC:
+    def __init__(self, graph: Graph, regs: Registers):
+        K = len(regs.all)
+
+        self.regs      = regs
+        self.adj       = { x: set(y) for x, y in graph.adj.items() }
+        self.degree    = { x: len(y) for x, y in graph.adj.items() }
+        self.forbidden = { x: set(y) for x, y in graph.forbidden.items() }
+        self.colours   = { x: K - len(y) for x, y in self.forbidden.items() }
+        self.costs     = dict(graph.costs)
+        self.moves     = graph.moves
+        self.alias     = {}
+        self.index     = { x: i for i, x in enumerate(graph.nodes) }
+
+        self.nmoves = { x: set() for x in graph.nodes }
+        for m, (x, y) in enumerate(graph.moves):
+            self.nmoves[x].add(m); self.nmoves[y].add(m)
+
+        # Worklists are dicts, used as insertion-ordered sets, for the
+        # output to be deterministic.
+        self.simplify_wl = {}
+        self.freeze_wl   = {}
+        self.spill_wl    = {}
+        self.moves_wl    = dict.fromkeys(range(len(graph.moves)))
+        self.active      = {}
+        self.stack       = []
+        self.onstack     = set()
+        self.coalesced   = set()
+
+        for x in graph.nodes:
+            if self.degree[x] >= self.colours[x]:
+                self.spill_wl[x] = None
+            elif self.move_related(x):
+                self.freeze_wl[x] = None
+            else:
+                self.simplify_wl[x] = None
+
+    # ----------------------------------------------------------------
+    def adjacent(self, x):
+        # In the order of the nodes: the adjacency sets are sets of strings,
+        # whose iteration order changes from one run to the other.
+        return sorted(self.adj[x] - self.onstack - self.coalesced, key = self.index.__getitem__)
+
+    def node_moves(self, x):
+        return [m for m in self.nmoves[x] if m in self.active or m in self.moves_wl]
+
+    def move_related(self, x):
+        return any(m in self.active or m in self.moves_wl for m in self.nmoves[x])
+
+    def get_alias(self, x):
+        root = x
+        while root in self.coalesced:
+            root = self.alias[root]
+
+        # Path compression, as aliases of aliases pile up on large graphs
+        while x != root:
+            self.alias[x], x = root, self.alias[x]
+
+        return root
+
+    def significant(self, x):
+        return self.degree[x] >= self.colours[x]
+
+    # ----------------------------------------------------------------
+    def add_edge(self, x, y):
+        if x != y and y not in self.adj[x]:
+            self.adj[x].add(y); self.adj[y].add(x)
+            self.degree[x] += 1; self.degree[y] += 1
+
+    def decrement_degree(self, x):
+        self.degree[x] -= 1
+
+        if self.degree[x] == self.colours[x] - 1:
+            self.enable_moves([x, *self.adjacent(x)])
+            self.spill_wl.pop(x, None)
+            if self.move_related(x):
+                self.freeze_wl[x] = None
+            else:
+                self.simplify_wl[x] = None
+
+    def enable_moves(self, xs):
+        for x in xs:
+            for m in self.node_moves(x):
+                if m in self.active:
+                    del self.active[m]
+                    self.moves_wl[m] = None
+
+    def add_worklist(self, x):
+        if x in self.freeze_wl and not self.move_related(x) and not self.significant(x):
+            del self.freeze_wl[x]
+            self.simplify_wl[x] = None
+
+    # ----------------------------------------------------------------
+    def simplify(self):
+        x = next(iter(self.simplify_wl))
+        del self.simplify_wl[x]
+
+        self.stack.append(x)
+        self.onstack.add(x)
+        for y in self.adjacent(x):
+            self.decrement_degree(y)
+
+    # ----------------------------------------------------------------
+    def briggs(self, u, v):
+        # The merged node has fewer significant neighbours than colours.
+        colours = len(self.regs.all) - len(self.forbidden[u] | self.forbidden[v])
+        k       = 0
+
+        for x in (self.adj[u] | self.adj[v]) - self.onstack - self.coalesced:
+            if self.significant(x):
+                k += 1
+                if k >= colours:
+                    return False
+        return True
+
+    def coalesce(self):
+        m = next(iter(self.moves_wl))
+        del self.moves_wl[m]
+
+        u, v = map(self.get_alias, self.moves[m])
+
+        if u == v:
+            self.add_worklist(u)
+        elif v in self.adj[u]:
+            self.add_worklist(u)
+            self.add_worklist(v)
+        elif self.briggs(u, v):
+            self.combine(u, v)
+            self.add_worklist(u)
+        else:
+            self.active[m] = None
+
+    def combine(self, u, v):
+        if v in self.freeze_wl:
+            del self.freeze_wl[v]
+        else:
+            del self.spill_wl[v]
+
+        self.coalesced.add(v)
+        self.alias[v]       = u
+        self.nmoves[u]     |= self.nmoves[v]
+        self.forbidden[u]  |= self.forbidden[v]
+        self.colours[u]     = len(self.regs.all) - len(self.forbidden[u])
+        self.costs[u]      += self.costs[v]
+        self.enable_moves([v])
+
+        for x in self.adjacent(v):
+            self.add_edge(x, u)
+            self.decrement_degree(x)
+
+        if self.significant(u) and u in self.freeze_wl:
+            del self.freeze_wl[u]
+            self.spill_wl[u] = None
+        elif self.significant(u) and u in self.simplify_wl:
+            # Possible when the merge restricted the colours of `u`
+            del self.simplify_wl[u]
+            self.spill_wl[u] = None
+
+    # ----------------------------------------------------------------
+    def freeze(self):
+        x = next(iter(self.freeze_wl))
+        del self.freeze_wl[x]
+        self.simplify_wl[x] = None
+        self.freeze_moves(x)
+
+    def freeze_moves(self, u):
+        for m in self.node_moves(u):
+            x, y = map(self.get_alias, self.moves[m])
+            v    = x if y == self.get_alias(u) else y
+
+            self.active.pop(m, None)
+            self.moves_wl.pop(m, None)
+
+            if v in self.freeze_wl and not self.move_related(v) and not self.significant(v):
+                del self.freeze_wl[v]
+                self.simplify_wl[v] = None
+
+    # ----------------------------------------------------------------
+    def select_spill(self):
+        x = min(self.spill_wl, key = lambda x: self.costs[x] / max(self.degree[x], 1))
+        del self.spill_wl[x]
+        self.simplify_wl[x] = None
+        self.freeze_moves(x)
+
+    # ----------------------------------------------------------------
+    def assign(self) -> Allocation:
+        registers = {}
+        spilled   = set()
+
+        while self.stack:
+            x = self.stack.pop()
+            self.onstack.discard(x)
+
+            taken = { registers.get(self.get_alias(y)) for y in self.adj[x] }
+            free  = [r for r in self.regs.all if r not in taken and r not in self.forbidden[x]]
+
+            # Biased colouring: the register of a move partner, if free, as
+            # the move then goes away even though it was not coalesced.
+            partners = { registers.get(self.get_alias(y)) for m in self.nmoves[x] for y in self.moves[m] }
+            free.sort(key = lambda r: r not in partners)
+
+            if free:
+                registers[x] = free[0]
+            else:
+                spilled.add(x)
+
+        for x in sorted(self.coalesced):
+            if (y := self.get_alias(x)) in registers:
+                registers[x] = registers[y]
+            else:
+                spilled.add(x)
+
+        return Allocation(registers, spilled)
+
+    # ----------------------------------------------------------------
+    def __call__(self) -> Allocation:
+        while True:
+            if self.simplify_wl:
+                self.simplify()
+            elif self.moves_wl:
+                self.coalesce()
+            elif self.freeze_wl:
+                self.freeze()
+            elif self.spill_wl:
+                self.select_spill()
+            else:
+                break
+        return self.assign()
+
+# ====================================================================
+# Stack slots
+#
+# The temporaries that are left on the stack are given slots by greedy
+# colouring of their interference graph: temporaries whose live ranges
+# are disjoint share a slot, so that the frame grows with the number of
+# values that are live at once rather than with the procedure length.
+# The nodes being in the order of their first occurrence, this is an
+# optimal colouring of the interval graphs of straight-line code. As for
+# registers, the ends of a copy get the same slot when possible.
+
+def stack_slots(graph: Graph) -> dict[str, int]:
+    slots    = {}
+    partners = { x: [] for x in graph.nodes }
+
+    for x, y in graph.moves:
+        partners[x].append(y); partners[y].append(x)
+
+    for temp in graph.nodes:
+        taken = { slots.get(x) for x in graph.adj[temp] }
+        hints = [slots[x] for x in partners[temp] if x in slots and slots[x] not in taken]
+
+        if hints:
+            slots[temp] = hints[0]
+        else:
+            slots[temp] = next(i for i in range(len(taken) + 1) if i not in taken)
+
+    return slots
+
+# ====================================================================
+def _linear(proc: TACProc, live: LiveSets, regs: Registers, exclude) -> Allocation:
+    return linear_scan(intervals(proc, live, regs, exclude), regs)
+
+def _irc(proc: TACProc, live: LiveSets, regs: Registers, exclude) -> Allocation:
+    return IRC(interference(proc, live, regs, exclude), regs)()
+
+ALLOCATORS = {
+    'linear': _linear,
+    'irc'   : _irc,
+}
+
+def allocate(
+        proc     : TACProc,
+        regs     : Registers,
+        allocator: str = 'linear',
+        exclude  : tp.Collection[str] = (),
+) -> Allocation:
+    """Allocate the temporaries of `proc` to the registers `regs` with
+    `allocator`, and the other ones to stack slots (see stack_slots).
+    The temporaries in `exclude` are left on the stack, but get no slot:
+    their memory is not shared."""
+
+    live  = LiveSets(proc.tac)
+    alloc = ALLOCATORS[allocator](proc, live, regs, exclude)
+
+    graph = interference(proc, live, regs, set(alloc.registers) | set(exclude))
+    alloc.slots = stack_slots(graph)
+
+    return alloc
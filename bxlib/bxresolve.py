@@ -0,0 +1,114 @@
+# --------------------------------------------------------------------
+from .bxast    import *
+from .bxerrors import Reporter
+from .bxscope  import Scope
+
+# ====================================================================
+# Name resolution: binds every variable occurrence (and every local
+# declaration) to a `Binding`, so that later passes never have to look
+# names up again.
+
+class Resolver:
+    def __init__(self, scope : Scope, reporter : Reporter):
+        self.scope    = scope           # globals, as filled by the PreTyper
+        self.reporter = reporter
+        self.nlocals  = 0
+
+    def declare(self, name : Name, binding : Binding):
+        if self.scope.islocal(name.value):
+            self.reporter(f'duplicated variable declaration for {name.value}')
+            return None
+        self.scope.push(name.value, binding)
+        return binding
+
+    def lookup(self, name : Name):
+        if name.value not in self.scope:
+            self.reporter(
+                f'missing variable declaration for {name.value}',
+                position = name.position,
+            )
+            return None
+        return self.scope[name.value]
+
+    def for_expression(self, expr : Expression):
+        match expr:
+            case VarExpression(name):
+                expr.binding = self.lookup(name)
+
+            case OpAppExpression(_, arguments) | CallExpression(_, arguments):
+                for argument in arguments:
+                    self.for_expression(argument)
+
+            case PrintExpression(e) | ReferenceExpression(e) | DereferenceExpression(e):
+                self.for_expression(e)
+
+            case AccessExpression(array, index):
+                self.for_expression(array)
+                self.for_expression(index)
+
+            case AllocateExpression(size, _):
+                self.for_expression(size)
+
+            case _:
+                pass
+
+    def for_statement(self, stmt : Statement):
+        match stmt:
+            case VarDeclStatement(name, init, type_):
+                stmt.binding = self.declare(
+                    name, Binding(Storage.LOCAL, self.nlocals, type_)
+                )
+                if stmt.binding is not None:
+                    self.nlocals += 1
+                self.for_expression(init)
+
+            case AssignStatement(lhs, rhs):
+                stmt.binding = self.lookup(lhs)
+                self.for_expression(rhs)
+
+            case ExprStatement(expression):
+                self.for_expression(expression)
+
+            case BlockStatement(block):
+                with self.scope.in_subscope():
+                    for stmt in block:
+                        self.for_statement(stmt)
+
+            case IfStatement(condition, iftrue, iffalse):
+                self.for_expression(condition)
+                self.for_statement(iftrue)
+                if iffalse is not None:
+                    self.for_statement(iffalse)
+
+            case WhileStatement(condition, body):
+                self.for_expression(condition)
+                self.for_statement(body)
+
+            case PrintStatement(e):
+                self.for_expression(e)
+
+            case ReturnStatement(e):
+                if e is not None:
+                    self.for_expression(e)
+
+            case BreakStatement() | ContinueStatement():
+                pass
+
+            case _:
+                assert(False)
+
+    def for_topdecl(self, decl : TopDecl):
+        match decl:
+            case ProcDecl(name, arguments, retty, body):
+                self.nlocals = 0
+                with self.scope.in_subscope():
+                    for i, (vname, vtype_) in enumerate(arguments):
+                        self.declare(vname, Binding(Storage.PARAM, i, vtype_))
+                    self.for_statement(body)
+
+            case GlobVarDecl(name, init, type_):
+                self.for_expression(init)
+
+    def resolve(self, prgm : Program):
+        for decl in prgm:
+            self.for_topdecl(decl)
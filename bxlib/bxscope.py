@@ -3,32 +3,43 @@ import contextlib as cl
 import typing as tp
 
 # ====================================================================
+# Every name is mapped to the stack of its bindings, innermost last,
+# each binding being tagged with the depth of the scope that holds it.
+# Every scope records the names it binds, so that it can undo them when
+# it is closed.
+
 class Scope:
     def __init__(self):
-        self.vars = [dict()]
+        self.bindings: dict[str, list[tuple[int, tp.Any]]] = {}
+        self.frames  : list[list[str]] = [[]]
 
     def open(self):
-        self.vars.append(dict())
+        self.frames.append([])
 
     def close(self):
-        assert(len(self.vars) > 0)
-        self.vars.pop()
+        assert(len(self.frames) > 0)
+        for name in self.frames.pop():
+            stack = self.bindings[name]
+            stack.pop()
+            if not stack:
+                del self.bindings[name]
 
     def push(self, name: str, data: tp.Any):
-        assert(name not in self.vars[-1])
-        self.vars[-1][name] = data
+        assert(not self.islocal(name))
+        self.bindings.setdefault(name, []).append((len(self.frames), data))
+        self.frames[-1].append(name)
 
     def islocal(self, name: str):
-        return name in self.vars[-1]
+        stack = self.bindings.get(name)
+        return stack is not None and stack[-1][0] == len(self.frames)
 
     def __getitem__(self, name: str):
-        for s in self.vars[::-1]:
-            if name in s:
-                return s[name]
-        assert(False)
+        stack = self.bindings.get(name)
+        assert(stack is not None)
+        return stack[-1][1]
 
     def __contains__(self, name: str):
-        return any(name in s for s in self.vars)
+        return name in self.bindings
 
     @cl.contextmanager
     def in_subscope(self):
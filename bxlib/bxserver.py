@@ -0,0 +1,157 @@
+# --------------------------------------------------------------------
+import asyncio
+import concurrent.futures as cf
+import json
+import os
+import signal
+import sys
+import typing as tp
+
+from . import bxclient
+from . import bxdriver
+
+from .bxbuildcache import BuildCache
+
+# ====================================================================
+# Resident compile server
+#
+# The server listens on a Unix domain socket and keeps a pool of worker
+# processes, each one holding warm parsers, lexers and backends. Clients
+# are served concurrently by an asyncio loop that dispatches each file
+# of a request to the pool. See bxclient.py for the protocol.
+#
+# Requests are JSON objects with a `command` field:
+#
+#  - `compile`: compile `files`, a list of [source, basename] pairs,
+#    with the `parser` and `lexer` backends. When `basename` is null,
+#    the assembly is returned in the answer instead of being linked to
+#    {basename}.exe. If `cache` is a [directory, maximum size] pair,
+#    the corresponding build cache is used. If `savetemps` is true, the
+#    assembly is also written to {basename}.s. `optlevel` is the
+#    optimisation level (see bxdriver.OPTLEVELS). The answer holds one
+#    {ok, output, asm} object per file, `output` being the diagnostics.
+#
+#  - `stop`: shut the server down.
+#
+# A request (but `stop`) whose `signature` does not match the one of
+# the compiler the server has been started from is rejected.
+
+MAX_REQUEST = 1 << 26
+
+class Server:
+    def __init__(self, path: tp.Optional[str] = None, jobs: int = 0,
+                       parser: str = 'lalr', lexer: str = 'ply'):
+        self.path      = path or bxclient.socket_path()
+        self.signature = bxclient.signature()
+        self.jobs      = jobs or os.cpu_count()
+        self.pool      = cf.ProcessPoolExecutor(max_workers = self.jobs)
+        self.warmup    = (parser, lexer)
+        self.stopped   = None
+
+    # ----------------------------------------------------------------
+    async def _compile(self, request: dict) -> dict:
+        loop    = asyncio.get_running_loop()
+        parser  = request.get('parser', 'lalr')
+        lexer   = request.get('lexer', 'ply')
+        cache   = request.get('cache')
+        cache   = None if cache is None else BuildCache(*cache)
+        temps   = bool(request.get('savetemps', False))
+        level   = request.get('optlevel', 1)
+
+        if level not in bxdriver.OPTLEVELS:
+            return dict(ok = False, error = f'invalid optimisation level: {level}')
+
+        futures = [
+            loop.run_in_executor(
+                self.pool, bxdriver.compile_job,
+                (source, basename, parser, lexer, cache, 1, temps, level),
+            )
+            for source, basename in request['files']
+        ]
+
+        results = []
+        for ok, output, asm, _ in await asyncio.gather(*futures):
+            results.append(dict(ok = ok, output = output, asm = asm))
+        return dict(ok = True, results = results)
+
+    # ----------------------------------------------------------------
+    async def _answer(self, request: dict) -> dict:
+        match request.get('command'):
+            case 'stop':
+                self.stopped.set()
+                return dict(ok = True)
+
+            case _ if request.get('signature') != self.signature:
+                return dict(ok = False, error = 'compiler version mismatch')
+
+            case 'compile':
+                return await self._compile(request)
+
+            case command:
+                return dict(ok = False, error = f'unknown command: {command}')
+
+    # ----------------------------------------------------------------
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            try:
+                request = json.loads(await reader.readline())
+                answer  = await self._answer(request)
+            except (ValueError, KeyError, TypeError) as e:
+                answer  = dict(ok = False, error = f'invalid request: {e}')
+            writer.write(json.dumps(answer).encode('utf-8') + b'\n')
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # ----------------------------------------------------------------
+    def _unlink_stale(self):
+        # Refuse to replace the socket of a live server.
+        if bxclient.request(dict(command = 'ping'), self.path) is not None:
+            raise OSError(f'a server is already listening on {self.path}')
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    # ----------------------------------------------------------------
+    async def serve(self):
+        loop         = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self.stopped.set)
+
+        self._unlink_stale()
+
+        umask = os.umask(0o077)         # Only our user may connect
+        try:
+            server = await asyncio.start_unix_server(
+                self._client, self.path, limit = MAX_REQUEST,
+            )
+        finally:
+            os.umask(umask)
+
+        # Start all the workers upfront, so that no client pays for it.
+        await asyncio.gather(*[
+            loop.run_in_executor(self.pool, bxdriver.warm, *self.warmup)
+            for _ in range(self.jobs)
+        ])
+
+        print(f'bxc: serving on {self.path}', file = sys.stderr)
+
+        try:
+            async with server:
+                await self.stopped.wait()
+        finally:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+            self.pool.shutdown()
+
+# --------------------------------------------------------------------
+def serve(path: tp.Optional[str] = None, jobs: int = 0,
+          parser: str = 'lalr', lexer: str = 'ply'):
+    asyncio.run(Server(path, jobs, parser, lexer).serve())
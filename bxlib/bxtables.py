@@ -0,0 +1,69 @@
+# --------------------------------------------------------------------
+import hashlib
+import os
+import pickle
+import tempfile
+
+import ply
+
+# ====================================================================
+# On-disk cache for the tables built by the PLY-based front-end
+
+VERSION = 1
+
+def cache_dir() -> str:
+    if 'BXC_CACHE_DIR' in os.environ:
+        return os.environ['BXC_CACHE_DIR']
+    root = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(root, 'bxc')
+
+def enabled() -> bool:
+    return os.environ.get('BXC_NO_TABLE_CACHE', '') in ('', '0')
+
+# --------------------------------------------------------------------
+def signature(*parts) -> str:
+    digest = hashlib.sha256()
+    for part in (VERSION, ply.__version__) + parts:
+        digest.update(repr(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+# --------------------------------------------------------------------
+def _path(kind: str, key: str) -> str:
+    return os.path.join(cache_dir(), f'{kind}-{key[:32]}.pickle')
+
+def load(kind: str, key: str):
+    if not enabled():
+        return None
+
+    try:
+        with open(_path(kind, key), 'rb') as stream:
+            data = pickle.load(stream)
+    except (OSError, pickle.PickleError, EOFError, AttributeError, ValueError):
+        return None
+
+    if not isinstance(data, dict) or data.get('signature') != key:
+        return None
+    return data['tables']
+
+def store(kind: str, key: str, tables):
+    if not enabled():
+        return
+
+    # The file is written under a temporary name and then renamed, so
+    # that concurrent compiler invocations never observe a partial table.
+    try:
+        os.makedirs(cache_dir(), exist_ok = True)
+        fd, tmp = tempfile.mkstemp(dir = cache_dir(), suffix = '.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as stream:
+                pickle.dump(
+                    dict(signature = key, tables = tables),
+                    stream, protocol = pickle.HIGHEST_PROTOCOL,
+                )
+            os.replace(tmp, _path(kind, key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except OSError:
+        pass
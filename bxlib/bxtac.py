@@ -51,6 +51,7 @@ class TACProc:
         self.name      = name
         self.arguments = arguments
         self.tac       = []
+        self.var_sizes = {}             # Temporaries of arrays -> their size, in bytes
 
     def __repr__(self):
         aout = f"proc @{self.name}"
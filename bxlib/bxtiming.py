@@ -0,0 +1,150 @@
+# --------------------------------------------------------------------
+import contextlib as cl
+import json
+import os
+import resource
+import time
+import tracemalloc
+import typing as tp
+
+# ====================================================================
+# Per-pass instrumentation (bxc.py --time-passes)
+#
+# The passes of the compiler are wrapped in `phase(name, proc)`, which
+# does nothing unless a PassTimer has been activated. For each phase, a
+# PassTimer records its wall time, its CPU time (including the one of
+# child processes, for gcc) and the peak of the memory allocated by
+# Python while it ran (unless disabled, tracemalloc being costly).
+# Phases do not nest.
+
+def _cpu_ns() -> int:
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time_ns() + round((children.ru_utime + children.ru_stime) * 1e9)
+
+# --------------------------------------------------------------------
+class PassTimer:
+    def __init__(self, source: str, memory: bool = True):
+        self.source = source
+        self.memory = memory
+        self.events = []
+
+    # ----------------------------------------------------------------
+    @cl.contextmanager
+    def phase(self, name: str, proc: tp.Optional[str] = None):
+        if self.memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        cpu0  = _cpu_ns()
+        wall0 = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            wall1 = time.perf_counter_ns()
+            cpu1  = _cpu_ns()
+            peak  = tracemalloc.get_traced_memory()[1] - base if self.memory else 0
+            self.events.append(dict(
+                name  = name,
+                proc  = proc,
+                pid   = os.getpid(),
+                start = wall0 // 1000,
+                wall  = (wall1 - wall0) // 1000,
+                cpu   = (cpu1 - cpu0) // 1000,
+                peak  = max(peak, 0),
+            ))
+
+    # ----------------------------------------------------------------
+    def report(self) -> str:
+        """A human-readable report of the recorded phases: totals per
+        phase, then the per-procedure breakdown."""
+
+        totals = {}
+        procs  = {}
+
+        for event in self.events:
+            total = totals.setdefault(event['name'], [0, 0, 0, 0])
+            total[0] += 1
+            total[1] += event['wall']
+            total[2] += event['cpu']
+            total[3]  = max(total[3], event['peak'])
+            if event['proc'] is not None:
+                procs.setdefault(event['proc'], {})[event['name']] = event['wall']
+
+        aout = [
+            f'===== pass timings: {self.source} =====',
+            f'{"pass":<12} {"count":>6} {"wall (ms)":>10} {"cpu (ms)":>10} {"peak (KiB)":>11}',
+        ]
+
+        for name, (count, wall, cpu, peak) in totals.items():
+            aout.append(f'{name:<12} {count:>6} {wall/1e3:>10.3f} {cpu/1e3:>10.3f} {peak/1024:>11.1f}')
+
+        wall = sum(x[1] for x in totals.values())
+        cpu  = sum(x[2] for x in totals.values())
+        aout.append(f'{"total":<12} {"":>6} {wall/1e3:>10.3f} {cpu/1e3:>10.3f}')
+
+        if procs:
+            names = [x for x in totals if any(x in p for p in procs.values())]
+            aout.append('')
+            aout.append(f'{"procedure":<24} ' + ' '.join(f'{x + " (ms)":>12}' for x in names))
+            for proc, walls in procs.items():
+                aout.append(f'{proc:<24} ' + ' '.join(
+                    f'{walls[x]/1e3:>12.3f}' if x in walls else f'{"":>12}' for x in names
+                ))
+
+        return '\n'.join(aout) + '\n'
+
+# --------------------------------------------------------------------
+_timer: tp.Optional[PassTimer] = None
+
+@cl.contextmanager
+def timing(source: str, memory: bool = True):
+    """Activate a fresh PassTimer for the compilation of `source`."""
+
+    global _timer
+
+    started = memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+
+    _timer = PassTimer(source, memory)
+    try:
+        yield _timer
+    finally:
+        _timer = None
+        if started:
+            tracemalloc.stop()
+
+def enabled() -> bool:
+    return _timer is not None
+
+def phase(name: str, proc: tp.Optional[str] = None):
+    if _timer is None:
+        return cl.nullcontext()
+    return _timer.phase(name, proc)
+
+# --------------------------------------------------------------------
+def chrome_trace(timed: list[tuple[str, list[dict]]]) -> str:
+    """The Chrome trace-event JSON of the phases `timed`, given as
+    (source, events) pairs."""
+
+    events = []
+
+    for source, xs in timed:
+        for x in xs:
+            name = x['name'] if x['proc'] is None else f"{x['name']}:{x['proc']}"
+            events.append(dict(
+                name = name,
+                cat  = x['name'],
+                ph   = 'X',
+                ts   = x['start'],
+                dur  = x['wall'],
+                pid  = x['pid'],
+                tid  = 0,
+                args = dict(
+                    source     = source,
+                    proc       = x['proc'],
+                    cpu_us     = x['cpu'],
+                    peak_bytes = x['peak'],
+                ),
+            ))
+
+    return json.dumps(dict(traceEvents = events, displayTimeUnit = 'ms'), indent = 1)
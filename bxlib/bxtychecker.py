@@ -2,9 +2,10 @@
 import contextlib as cl
 import typing as tp
 
-from .bxerrors import Reporter
-from .bxast    import *
-from .bxscope  import Scope
+from .bxerrors  import Reporter
+from .bxast     import *
+from .bxresolve import Resolver
+from .bxscope   import Scope
 
 # ====================================================================
 SigType    = tuple[tuple[Type], Opt[Type]]
@@ -42,7 +43,7 @@ class PreTyper:
                         )
                         continue
 
-                    scope.push(name.value, type_)
+                    scope.push(name.value, Binding(Storage.GLOBAL, name.value, type_))
 
                 case _:
                     assert(False)
@@ -61,10 +62,6 @@ class TypeChecker:
     B : Type = Type.BOOL
     I : Type = Type.INT
 
-    #Extending here?
-    P : Type = Type.POINTER
-    A : Type = Type.ARRAY
-
     SIGS = {
         'opposite'                 : ([I   ], I),
         'bitwise-negation'         : ([B   ], B),
@@ -89,8 +86,7 @@ class TypeChecker:
         'cmp-greater-or-equal-than': ([I, I], B),
     }
 
-    def __init__(self, scope : Scope, procs : ProcSigMap, reporter : Reporter):
-        self.scope    = scope
+    def __init__(self, procs : ProcSigMap, reporter : Reporter):
         self.procs    = procs
         self.loops    = 0
         self.proc     = None
@@ -112,27 +108,13 @@ class TypeChecker:
         assert(self.proc is None)
 
         self.proc = proc
-        self.scope.open()
         try:
             yield self
         finally:
             self.proc = None
-            self.scope.close()
-
-    def check_local_free(self, name : Name):
-        if self.scope.islocal(name.value):
-            self.report(f'duplicated variable declaration for {name.value}')
-            return False
-        return True
 
-    def check_local_bound(self, name : Name):
-        if name.value not in self.scope:
-            self.report(
-                f'missing variable declaration for {name.value}',
-                position = name.position,
-            )
-            return None
-        return self.scope[name.value]
+    def binding_type(self, binding : Opt[Binding]):
+        return None if binding is None else binding.type_
 
     def check_integer_constant_range(self, value : int):
         if value not in range(-(1 << 63), 1 << 63):
@@ -151,7 +133,7 @@ class TypeChecker:
 
             case ReferenceExpression(value):
                 self.for_expression(value)
-                if isinstance(value.type_, Type):
+                if isinstance(value.type_, (Type, InternedType)):
                     type_ = Pointer(value.type_)
                 else:
                     self.report(f'Invalid reference type for {value}', position=expr.position)
@@ -178,8 +160,7 @@ class TypeChecker:
 
 
             case VarExpression(name):
-                if self.check_local_bound(name):
-                    type_ = self.scope[name.value]
+                type_ = self.binding_type(expr.binding)
 
             case BoolExpression(_):
                 type_ = Type.BOOL
@@ -245,12 +226,10 @@ class TypeChecker:
     def for_statement(self, stmt : Statement):
         match stmt:
             case VarDeclStatement(name, init, type_):
-                if self.check_local_free(name):
-                    self.scope.push(name.value, type_)
                 self.for_expression(init, etype = type_)
 
             case AssignStatement(lhs, rhs):
-                lhstype = self.check_local_bound(lhs)
+                lhstype = self.binding_type(stmt.binding)
                 self.for_expression(rhs, etype = lhstype)
 
             case ExprStatement(expression):
@@ -300,17 +279,13 @@ class TypeChecker:
                 assert(False)
 
     def for_block(self, block : Block):
-        with self.scope.in_subscope():
-            for stmt in block:
-                self.for_statement(stmt)
+        for stmt in block:
+            self.for_statement(stmt)
 
     def for_topdecl(self, decl : TopDecl):
         match decl:
             case ProcDecl(name, arguments, retty, body):
                 with self.in_proc(decl):
-                    for vname, vtype_ in arguments:
-                        if self.check_local_free(vname):
-                            self.scope.push(vname.value, vtype_)
                     self.for_statement(body)
 
                     if retty is not None:
@@ -360,9 +335,24 @@ class TypeChecker:
     def check(self, prgm : Program):
         self.for_program(prgm)
 
+# --------------------------------------------------------------------
+class DeclChecker:
+    """Resolve and type-check the declarations of a pretyped program one
+    at a time, so that a declaration can be processed further (and then
+    released) before the next one is checked."""
+
+    def __init__(self, scope : Scope, procs : ProcSigMap, reporter : Reporter):
+        self.resolver = Resolver(scope, reporter)
+        self.checker  = TypeChecker(procs, reporter)
+
+    def __call__(self, decl : TopDecl):
+        self.resolver.for_topdecl(decl)
+        self.checker.for_topdecl(decl)
+
 # --------------------------------------------------------------------
 def check(prgm : Program, reporter : Reporter):
     with reporter.checkpoint() as checkpoint:
         scope, procs = PreTyper(reporter).pretype(prgm)
-        TypeChecker(scope, procs, reporter).check(prgm)
+        Resolver(scope, reporter).resolve(prgm)
+        TypeChecker(procs, reporter).check(prgm)
         return bool(checkpoint)